@@ -1,8 +1,9 @@
 from argparse import ArgumentParser
 
-from fea.openseespy import fea_opensees
-from fea.pynite import fea_pynite
-from fea.utils import ForceType, get_breaking_compression_tension_edges
+import numpy as np
+
+from fea.backends import FEA_BACKENDS, fea_load_cases
+from fea.utils import ForceType, check_members, get_load_case_names
 from utils.parser import read_json
 from utils.plot import visualize
 
@@ -10,40 +11,43 @@ from utils.plot import visualize
 def main() -> None:
     parser = ArgumentParser()
     parser.add_argument("--input", type=str)
-    parser.add_argument(
-        "--fea", type=str, choices=["simple", "complex"], default="simple"
-    )
+    parser.add_argument("--fea", type=str, choices=list(FEA_BACKENDS), default="simple")
     args = parser.parse_args()
 
     nodes, edges = read_json(args.input)
-    if args.fea == "simple":
-        max_forces = fea_pynite(nodes, edges)
-    if args.fea == "complex":
-        max_forces = fea_opensees(nodes, edges)
-    print(max_forces)
-
-    compression_tension_edges = get_breaking_compression_tension_edges(
-        edges, max_forces
-    )
-    for entry in compression_tension_edges:
+    load_case_names = get_load_case_names(nodes)
+    case_forces = fea_load_cases(args.fea, nodes, edges)
+
+    compression_edges = []
+    tension_edges = []
+    for name, max_forces in zip(load_case_names, case_forces):
+        if len(load_case_names) > 1:
+            print(f"Load case {name}")
+        print(max_forces)
+
+        member_check = check_members(edges, max_forces)
+        for i in np.flatnonzero(member_check.breaking):
+            force_type = (
+                ForceType.COMPRESSION
+                if member_check.compression[i]
+                else ForceType.TENSION
+            )
+            print(
+                f"Member {edges[i].id}: Max force of {member_check.max_forces[i]}, {force_type} exceeds the euler load of {member_check.euler_loads[i]}"
+            )
+
         print(
-            f"Member {entry['id']}: Max force of {entry['max_force']}, {entry['force_type']} exceeds the euler load of {entry['euler_load']}"
+            f"The euler load is exceeded for {np.count_nonzero(member_check.breaking)} of {len(edges)} members"
         )
 
-    print(
-        f"The euler load is exceeded for {len(compression_tension_edges)} of {len(edges)} members"
-    )
-
-    compression_edges = [
-        entry["id"]
-        for entry in compression_tension_edges
-        if entry["force_type"] == ForceType.COMPRESSION
-    ]
-    tension_edges = [
-        entry["id"]
-        for entry in compression_tension_edges
-        if entry["force_type"] == ForceType.TENSION
-    ]
+        compression_edges += [
+            edges[i].id
+            for i in np.flatnonzero(member_check.breaking & member_check.compression)
+        ]
+        tension_edges += [
+            edges[i].id
+            for i in np.flatnonzero(member_check.breaking & member_check.tension)
+        ]
 
     visualize(
         nodes=nodes,
@@ -0,0 +1,194 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from fea.generators import GENERATORS
+from fea.openseespy import OpenSeesSession
+from fea.pynite import analyze_pynite_model, build_pynite_model, get_pynite_forces
+from fea.truss import TrussSolution
+from utils.models import Edge, Node
+from utils.parser import write_json
+
+# Generator parameters (storeys, panels, rings) of the default benchmark models
+SIZES = {
+    "tower": [10, 100, 1000, 4000],
+    "bridge": [10, 100, 1000, 4000],
+    "dome": [5, 20, 50, 100],
+}
+# Larger models are skipped, the dense PyNite solve does not scale beyond a few thousand members
+MAX_MEMBERS = {"simple": 3000, "complex": 60000, "truss": 100000}
+
+
+def run_simple(nodes: list[Node], edges: list[Edge]) -> dict:
+    times = [perf_counter()]
+    truss = build_pynite_model(nodes, edges)
+    times.append(perf_counter())
+    # PyNite prints the statics check
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyze_pynite_model(truss)
+    times.append(perf_counter())
+    get_pynite_forces(truss)
+    times.append(perf_counter())
+    return dict(zip(["build", "solve", "extract"], np.diff(times)))
+
+
+def run_complex(nodes: list[Node], edges: list[Edge]) -> dict:
+    times = [perf_counter()]
+    session = OpenSeesSession()
+    session.update(nodes, edges)
+    times.append(perf_counter())
+    session.solve()
+    times.append(perf_counter())
+    session.get_forces(edges)
+    times.append(perf_counter())
+    return dict(zip(["build", "solve", "extract"], np.diff(times)))
+
+
+def run_truss(nodes: list[Node], edges: list[Edge]) -> dict:
+    times = [perf_counter()]
+    solution = TrussSolution(nodes, edges, solve=False)
+    k_free = solution.assemble()
+    times.append(perf_counter())
+    solution.solve(k_free)
+    times.append(perf_counter())
+    solution.max_forces
+    times.append(perf_counter())
+    return dict(zip(["build", "solve", "extract"], np.diff(times)))
+
+
+BACKENDS = {
+    "simple": run_simple,
+    "complex": run_complex,
+    "truss": run_truss,
+}
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(
+    model: str,
+    size: int,
+    nodes: list[Node],
+    edges: list[Edge],
+    backend: str,
+    repeat: int,
+) -> dict:
+    result = {
+        "model": model,
+        "size": size,
+        "backend": backend,
+        "nodes": len(nodes),
+        "members": len(edges),
+    }
+    if len(edges) > MAX_MEMBERS[backend]:
+        result["error"] = "skipped"
+        return result
+
+    run = BACKENDS[backend]
+    try:
+        # Best of the repetitions, the memory is traced in a separate run
+        # because tracemalloc slows down the python parts of the backends
+        runs = [run(nodes, edges) for _ in range(repeat)]
+        tracemalloc.start()
+        run(nodes, edges)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+    finally:
+        tracemalloc.stop()
+
+    for phase in ["build", "solve", "extract"]:
+        result[phase] = min(times[phase] for times in runs)
+    result["total"] = min(sum(times.values()) for times in runs)
+    result["peak_memory_mb"] = peak_memory / 2**20
+    # Peak resident memory of the whole process so far, includes C++ allocations of OpenSees
+    result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    return result
+
+
+def compare(baseline_file: str, results_file: str) -> None:
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    with open(results_file) as f:
+        results = json.load(f)
+    baseline_totals = {
+        (entry["model"], entry["size"], entry["backend"]): entry.get("total")
+        for entry in baseline["results"]
+    }
+    print(f"{baseline['commit']} -> {results['commit']}")
+    for entry in results["results"]:
+        key = (entry["model"], entry["size"], entry["backend"])
+        old, new = baseline_totals.get(key), entry.get("total")
+        if old is None or new is None:
+            continue
+        print(
+            f"{entry['model']:>8} {entry['size']:>6} {entry['backend']:>8}: {old:10.4f}s -> {new:10.4f}s ({old / new:6.2f}x)"
+        )
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--models", nargs="+", choices=list(GENERATORS), default=list(GENERATORS)
+    )
+    parser.add_argument("--sizes", nargs="+", type=int)
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=str, default="benchmark.json")
+    # Folder (with a trailing slash) to write the generated models to
+    parser.add_argument("--models_folder", type=str)
+    # Earlier output to compare the total times with
+    parser.add_argument("--compare", type=str)
+    args = parser.parse_args()
+
+    results = []
+    for model in args.models:
+        for size in args.sizes or SIZES[model]:
+            nodes, edges = GENERATORS[model](size)
+            if args.models_folder:
+                write_json(nodes, edges, args.models_folder, f"{model}_{size}.json")
+            for backend in args.backends:
+                result = benchmark(model, size, nodes, edges, backend, args.repeat)
+                print(result)
+                results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": get_commit(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    if args.compare:
+        compare(args.compare, args.output)
+
+
+if __name__ == "__main__":
+    main()
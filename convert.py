@@ -2,13 +2,19 @@ import os
 import uuid
 from argparse import ArgumentParser
 
+from utils.coordinate_index import NODE_TOLERANCE, CoordinateIndex
 from utils.models import Bool3, Edge, Node, Vector3
 from utils.parser import write_json
 
 
-def read_obj(input_file: str) -> tuple[list[Node], list[Edge]]:
+def read_obj(
+    input_file: str, tolerance: float = NODE_TOLERANCE
+) -> tuple[list[Node], list[Edge]]:
     nodes = []
     edges = []
+    # Vertices within the tolerance of an earlier one are merged into its node
+    node_index = CoordinateIndex(tolerance)
+    pairs = set()
     with open(input_file) as f:
         counter = 1
         mapping = {}
@@ -16,6 +22,11 @@ def read_obj(input_file: str) -> tuple[list[Node], list[Edge]]:
             if line.startswith("v "):
                 node_id = str(uuid.uuid4())
                 coordinates = list(map(float, line.strip().split()[1:]))
+                node = node_index.find(Vector3(*coordinates[:3]))
+                if node is not None:
+                    mapping[counter] = node
+                    counter += 1
+                    continue
                 if coordinates[1] < 0.2:
                     node = Node(
                         id=node_id,
@@ -35,12 +46,19 @@ def read_obj(input_file: str) -> tuple[list[Node], list[Edge]]:
                         fixed=True,
                     )
                 nodes.append(node)
+                node_index.add(node)
                 mapping[counter] = node
                 counter += 1
             if line.startswith("l "):
                 edge_id = str(uuid.uuid4())
                 node_ids = list(map(int, line.strip().split()[1:]))
-                edge = Edge(id=edge_id, u=mapping[node_ids[0]], v=mapping[node_ids[1]])
+                u, v = mapping[node_ids[0]], mapping[node_ids[1]]
+                # Lines between merged vertices are dropped
+                pair = frozenset([u.id, v.id])
+                if u is v or pair in pairs:
+                    continue
+                pairs.add(pair)
+                edge = Edge(id=edge_id, u=u, v=v)
                 edges.append(edge)
     return nodes, edges
 
@@ -67,9 +85,11 @@ def main() -> None:
     parser = ArgumentParser()
     parser.add_argument("--input", type=str, default="dino.obj")
     parser.add_argument("--output", type=str, default="dino.json")
+    # Distance below which vertices are merged
+    parser.add_argument("--tolerance", type=float, default=NODE_TOLERANCE)
     args = parser.parse_args()
 
-    nodes, edges = read_obj(args.input)
+    nodes, edges = read_obj(args.input, args.tolerance)
     dirname, filename = os.path.split(args.output)
     write_json(nodes=nodes, edges=edges, dirname=f"{dirname}/", filename=filename)
 
@@ -0,0 +1,29 @@
+from fea.openseespy import fea_opensees_load_cases, fea_opensees_session
+from fea.pynite import fea_pynite
+from fea.truss import TrussSolution, fea_truss
+from fea.utils import get_load_case_names, get_load_case_nodes
+from utils.models import Edge, Node
+
+# All FEA implementations share the signature (nodes, edges) -> {edge_id: axial_force}
+FEA_BACKENDS = {
+    "simple": fea_pynite,
+    "complex": fea_opensees_session,
+    "truss": fea_truss,
+}
+
+
+def fea_load_cases(fea: str, nodes: list[Node], edges: list[Edge]) -> list[dict]:
+    """Axial forces of every load case in the order of get_load_case_names.
+
+    The truss FEA solves all load cases with one factorization, the complex
+    FEA analyzes them in one OpenSees domain and the simple FEA builds the
+    model once per load case.
+    """
+    if fea == "truss":
+        return TrussSolution(nodes, edges).case_forces
+    if fea == "complex":
+        return fea_opensees_load_cases(nodes, edges)
+    return [
+        FEA_BACKENDS[fea](get_load_case_nodes(nodes, name), edges)
+        for name in get_load_case_names(nodes)
+    ]
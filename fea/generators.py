@@ -0,0 +1,125 @@
+import math
+
+from utils.models import Bool3, Edge, Node, Vector3
+
+
+def get_support() -> dict:
+    return {
+        "r_support": Bool3(x=False, y=False, z=False),
+        "t_support": Bool3(x=True, y=True, z=True),
+    }
+
+
+def generate_prism(
+    sections: list[list[Vector3]],
+    supported: set[tuple[int, int]],
+    loads: dict[tuple[int, int], Vector3],
+) -> tuple[list[Node], list[Edge]]:
+    """Triangulated prism through the given quadrilateral sections.
+
+    Every section gets its four sides and one diagonal, every bay between two
+    sections its four chords and one diagonal per side face. Nodes are indexed
+    by (section, corner).
+    """
+    nodes = {}
+    for i, section in enumerate(sections):
+        for j, vec in enumerate(section):
+            nodes[(i, j)] = Node(
+                id=f"node_{i}_{j}",
+                vec=vec,
+                load=loads.get((i, j)),
+                fixed=True,
+                **(get_support() if (i, j) in supported else {}),
+            )
+
+    pairs = []
+    for i in range(len(sections)):
+        pairs += [((i, j), (i, (j + 1) % 4)) for j in range(4)]
+        pairs.append(((i, 0), (i, 2)))
+        if i > 0:
+            pairs += [((i - 1, j), (i, j)) for j in range(4)]
+            pairs += [((i - 1, j), (i, (j + 1) % 4)) for j in range(4)]
+    edges = [Edge(f"edge_{k}", nodes[u], nodes[v]) for k, (u, v) in enumerate(pairs)]
+    return list(nodes.values()), edges
+
+
+def generate_tower(storeys: int, width=1.0, height=1.0, load=-1.0):
+    """Square tower with storeys levels above the supported base, loaded at the top."""
+    sections = [
+        [
+            Vector3(0, i * height, 0),
+            Vector3(width, i * height, 0),
+            Vector3(width, i * height, width),
+            Vector3(0, i * height, width),
+        ]
+        for i in range(storeys + 1)
+    ]
+    supported = {(0, j) for j in range(4)}
+    loads = {(storeys, j): Vector3(0, load, 0) for j in range(4)}
+    return generate_prism(sections, supported, loads)
+
+
+def generate_bridge(panels: int, length=1.0, width=1.0, height=1.0, load=-1.0):
+    """Box girder bridge with panels bays, supported at the bottom of both ends
+    and loaded at every inner bottom node."""
+    sections = [
+        [
+            Vector3(i * length, 0, 0),
+            Vector3(i * length, height, 0),
+            Vector3(i * length, height, width),
+            Vector3(i * length, 0, width),
+        ]
+        for i in range(panels + 1)
+    ]
+    supported = {(i, j) for i in [0, panels] for j in [0, 3]}
+    loads = {(i, j): Vector3(0, load, 0) for i in range(1, panels) for j in [0, 3]}
+    return generate_prism(sections, supported, loads)
+
+
+def generate_dome(rings: int, segments: int = 0, radius=5.0, load=-1.0):
+    """Triangulated lattice dome with rings above the supported base ring.
+
+    Every free node is loaded, segments defaults to twice the number of rings.
+    """
+    segments = segments or max(2 * rings, 3)
+    nodes = {}
+    for i in range(rings):
+        # Polar angle from the equator (i = 0) towards the apex
+        phi = math.pi / 2 * (1 - i / rings)
+        for j in range(segments):
+            theta = 2 * math.pi * (j + 0.5 * i) / segments
+            nodes[(i, j)] = Node(
+                id=f"node_{i}_{j}",
+                vec=Vector3(
+                    radius * math.sin(phi) * math.cos(theta),
+                    radius * math.cos(phi),
+                    radius * math.sin(phi) * math.sin(theta),
+                ),
+                load=Vector3(0, load, 0) if i > 0 else None,
+                fixed=True,
+                **(get_support() if i == 0 else {}),
+            )
+    nodes[(rings, 0)] = Node(
+        id="apex",
+        vec=Vector3(0, radius, 0),
+        load=Vector3(0, load, 0),
+        fixed=True,
+    )
+
+    pairs = []
+    for i in range(rings):
+        pairs += [((i, j), (i, (j + 1) % segments)) for j in range(segments)]
+        if i + 1 < rings:
+            pairs += [((i, j), (i + 1, j)) for j in range(segments)]
+            pairs += [((i, (j + 1) % segments), (i + 1, j)) for j in range(segments)]
+        else:
+            pairs += [((i, j), (rings, 0)) for j in range(segments)]
+    edges = [Edge(f"edge_{k}", nodes[u], nodes[v]) for k, (u, v) in enumerate(pairs)]
+    return list(nodes.values()), edges
+
+
+GENERATORS = {
+    "tower": generate_tower,
+    "bridge": generate_bridge,
+    "dome": generate_dome,
+}
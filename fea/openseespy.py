@@ -1,52 +1,110 @@
 import numpy as np
 import openseespy.opensees as ops
 
-from fea.utils import Material, SectionProperties
+from fea.utils import (
+    DEFAULT_LOAD_CASE,
+    Material,
+    SectionProperties,
+    get_load_case_names,
+    get_load_case_nodes,
+)
 from utils.models import Edge, Node
 
+# ops is a process global singleton, so only one session can own the domain at a time
+_active_session = None
 
-def fea_opensees(nodes: list[Node], edges: list[Edge]) -> dict:
-    node_mapping = {node.id: i for i, node in enumerate(nodes)}
-    edge_mapping = {edge.id: i for i, edge in enumerate(edges)}
-
-    material = Material()
-    section_properties = SectionProperties()
-
-    ops.wipe()
-    ops.model("basic", "-ndm", 3, "-ndf", 6)
-
-    ops.timeSeries("Constant", 1)
-    ops.pattern("Plain", 1, 1)
-
-    for node in nodes:
-        ops.node(node_mapping[node.id], node.vec.x, node.vec.y, node.vec.z)
-        if node.r_support is not None and node.t_support is not None:
-            ops.fix(
-                node_mapping[node.id],
-                int(node.t_support.x),
-                int(node.t_support.y),
-                int(node.t_support.z),
-                int(node.r_support.x),
-                int(node.r_support.y),
-                int(node.r_support.z),
-            )
-        if node.load:
-            ops.load(
-                node_mapping[node.id],
-                node.load.x,
-                node.load.y,
-                node.load.z,
-                0,
-                0,
-                0,
+
+def get_node_signature(node: Node) -> tuple:
+    return (
+        node.vec.x,
+        node.vec.y,
+        node.vec.z,
+        (
+            (
+                node.t_support.x,
+                node.t_support.y,
+                node.t_support.z,
+                node.r_support.x,
+                node.r_support.y,
+                node.r_support.z,
             )
+            if node.r_support is not None and node.t_support is not None
+            else None
+        ),
+        # The loads are applied for every analysis, only whether a node is
+        # loaded in any load case belongs to the domain
+        bool(node.load or node.load_cases),
+    )
+
+
+class OpenSeesSession:
+    """OpenSees domain which is kept between analyses.
+
+    The first analysis builds the domain, later analyses only remove or add the
+    members (and their unsupported, unloaded nodes) that changed since the
+    previous one. Any other change, like a moved node, rebuilds the domain.
+    The nodal loads are replaced before every analysis, so all load cases are
+    analyzed in the same domain.
+    """
+
+    def __init__(self) -> None:
+        self.material = Material()
+        self.section_properties = SectionProperties()
+        # node id -> (tag, signature) of the nodes in the domain
+        self.nodes = {}
+        # edge id -> (tag, start node id, end node id) of the elements in the domain
+        self.elements = {}
+        self.next_tag = 0
+
+    def _get_tag(self) -> int:
+        # Pattern 0 holds the nodal loads, pattern tag + 1 the self weight of element tag
+        self.next_tag += 1
+        return self.next_tag
+
+    def _build(self, nodes: list[Node]) -> None:
+        global _active_session
+        _active_session = self
+        self.nodes = {}
+        self.elements = {}
 
-    # Transformation of local coordinate system
-    ops.geomTransf("Linear", 1, 0, 0, 1)
-    ops.geomTransf("Linear", 2, 0, 1, 0)
-    ops.geomTransf("Linear", 3, 1, 0, 0)
+        ops.wipe()
+        ops.model("basic", "-ndm", 3, "-ndf", 6)
 
-    for edge in edges:
+        ops.timeSeries("Constant", 1)
+        ops.pattern("Plain", 0, 1)
+
+        for node in nodes:
+            self._add_node(node)
+            if node.r_support is not None and node.t_support is not None:
+                ops.fix(
+                    self.nodes[node.id][0],
+                    int(node.t_support.x),
+                    int(node.t_support.y),
+                    int(node.t_support.z),
+                    int(node.r_support.x),
+                    int(node.r_support.y),
+                    int(node.r_support.z),
+                )
+
+        # Transformation of local coordinate system
+        ops.geomTransf("Linear", 1, 0, 0, 1)
+        ops.geomTransf("Linear", 2, 0, 1, 0)
+        ops.geomTransf("Linear", 3, 1, 0, 0)
+
+        ops.system("ProfileSPD")
+        ops.numberer("RCM")
+        ops.constraints("Plain")
+        ops.integrator("LoadControl", 1.0)
+        ops.algorithm("Linear")
+        ops.analysis("Static")
+
+    def _add_node(self, node: Node) -> None:
+        tag = self._get_tag()
+        ops.node(tag, node.vec.x, node.vec.y, node.vec.z)
+        self.nodes[node.id] = (tag, get_node_signature(node))
+
+    def _add_element(self, edge: Edge) -> None:
+        tag = self._get_tag()
         # Select transformation
         transform = 1
         if edge.u.vec.x == edge.v.vec.x and edge.u.vec.y == edge.v.vec.y:
@@ -55,15 +113,15 @@ def fea_opensees(nodes: list[Node], edges: list[Edge]) -> dict:
             transform = 3
         ops.element(
             "elasticBeamColumn",
-            edge_mapping[edge.id],
-            node_mapping[edge.u.id],
-            node_mapping[edge.v.id],
-            section_properties.a,
-            material.e,
-            material.g,
-            section_properties.j,
-            section_properties.iz,
-            section_properties.iy,
+            tag,
+            self.nodes[edge.u.id][0],
+            self.nodes[edge.v.id][0],
+            self.section_properties.a,
+            self.material.e,
+            self.material.g,
+            self.section_properties.j,
+            self.section_properties.iz,
+            self.section_properties.iy,
             transform,
             "-releasez",
             1,  # should be 3
@@ -71,29 +129,125 @@ def fea_opensees(nodes: list[Node], edges: list[Edge]) -> dict:
             1,  # should be 3
         )
 
-    # Add self weight of the beams
-    for edge in edges:
-        b = [0, -material.rho * section_properties.a, 0]
-        wx = np.dot(ops.eleResponse(edge_mapping[edge.id], "xaxis"), b)  # x'*b
-        wy = np.dot(ops.eleResponse(edge_mapping[edge.id], "yaxis"), b)  # y'*b
-        wz = np.dot(ops.eleResponse(edge_mapping[edge.id], "zaxis"), b)  # z'*b
-        ops.eleLoad("-ele", edge_mapping[edge.id], "-type", "-beamUniform", wy, wz, wx)
-
-    ops.system("ProfileSPD")
-    ops.numberer("RCM")
-    ops.constraints("Plain")
-    ops.integrator("LoadControl", 1.0)
-    ops.algorithm("Linear")
-    ops.analysis("Static")
-
-    result = ops.analyze(1)
-    if result == -3:  # Ax=b failed
-        for nd in ops.getNodeTags():
-            node_id = next(k for k, v in node_mapping.items() if v == nd)
-            print(f"Node {node_id}: {ops.nodeDOFs(nd)}")
-        raise Exception("Singularity Error")
-
-    max_forces = {
-        edge.id: ops.basicForce(edge_mapping[edge.id])[0] * -1 for edge in edges
-    }
-    return max_forces
+        # Add self weight of the beam
+        ops.pattern("Plain", tag + 1, 1)
+        b = [0, -self.material.rho * self.section_properties.a, 0]
+        wx = np.dot(ops.eleResponse(tag, "xaxis"), b)  # x'*b
+        wy = np.dot(ops.eleResponse(tag, "yaxis"), b)  # y'*b
+        wz = np.dot(ops.eleResponse(tag, "zaxis"), b)  # z'*b
+        ops.eleLoad("-ele", tag, "-type", "-beamUniform", wy, wz, wx)
+        self.elements[edge.id] = (tag, edge.u.id, edge.v.id)
+
+    def _remove_element(self, edge_id: str) -> None:
+        tag = self.elements.pop(edge_id)[0]
+        ops.remove("ele", tag)
+        ops.remove("loadPattern", tag + 1)
+
+    def _needs_build(self, nodes: list[Node]) -> bool:
+        if _active_session is not self:
+            return True
+        signatures = {node.id: get_node_signature(node) for node in nodes}
+        for node_id, (_, signature) in self.nodes.items():
+            if node_id in signatures:
+                if signatures[node_id] != signature:
+                    return True
+            # Supports and loads are never removed from the domain
+            elif signature[3] is not None or signature[4]:
+                return True
+        return any(
+            node_id not in self.nodes and (signature[3] is not None or signature[4])
+            for node_id, signature in signatures.items()
+        )
+
+    def set_loads(self, nodes: list[Node]) -> None:
+        """Replaces the nodal loads of the domain with the Node.load of the nodes."""
+        ops.remove("loadPattern", 0)
+        ops.pattern("Plain", 0, 1)
+        for node in nodes:
+            if node.load:
+                ops.load(
+                    self.nodes[node.id][0],
+                    node.load.x,
+                    node.load.y,
+                    node.load.z,
+                    0,
+                    0,
+                    0,
+                )
+
+    def update(self, nodes: list[Node], edges: list[Edge]) -> None:
+        if self._needs_build(nodes):
+            self._build(nodes)
+        else:
+            # New elements take the current displacements of their nodes as offsets
+            ops.reset()
+
+        edge_ids = {edge.id: (edge.u.id, edge.v.id) for edge in edges}
+        for edge_id, (_, u, v) in list(self.elements.items()):
+            if edge_ids.get(edge_id) != (u, v):
+                self._remove_element(edge_id)
+        node_ids = {node.id for node in nodes}
+        for node_id in list(self.nodes):
+            if node_id not in node_ids:
+                ops.remove("node", self.nodes.pop(node_id)[0])
+        for node in nodes:
+            if node.id not in self.nodes:
+                self._add_node(node)
+        for edge in edges:
+            if edge.id not in self.elements:
+                self._add_element(edge)
+        self.set_loads(nodes)
+
+    def solve(self) -> None:
+        result = ops.analyze(1)
+        if result == -3:  # Ax=b failed
+            for node_id, (tag, _) in self.nodes.items():
+                print(f"Node {node_id}: {ops.nodeDOFs(tag)}")
+            raise Exception("Singularity Error")
+
+    def get_forces(self, edges: list[Edge]) -> dict:
+        max_forces = {
+            edge.id: ops.basicForce(self.elements[edge.id][0])[0] * -1 for edge in edges
+        }
+        return max_forces
+
+    def analyze(self, nodes: list[Node], edges: list[Edge]) -> dict:
+        self.update(nodes, edges)
+        self.solve()
+        return self.get_forces(edges)
+
+    def analyze_load_cases(self, nodes: list[Node], edges: list[Edge]) -> list[dict]:
+        """Axial forces of every load case in the order of get_load_case_names,
+        the domain is updated once and only the loads change between them."""
+        self.update(nodes, edges)
+        case_forces = []
+        for name in get_load_case_names(nodes):
+            if name != DEFAULT_LOAD_CASE:
+                ops.reset()
+                self.set_loads(get_load_case_nodes(nodes, name))
+            self.solve()
+            case_forces.append(self.get_forces(edges))
+        return case_forces
+
+
+_session = None
+
+
+def fea_opensees(nodes: list[Node], edges: list[Edge]) -> dict:
+    return OpenSeesSession().analyze(nodes, edges)
+
+
+def fea_opensees_session(nodes: list[Node], edges: list[Edge]) -> dict:
+    # Reuses the domain of the previous call, which is cheap if only a few members changed
+    global _session
+    if _session is None:
+        _session = OpenSeesSession()
+    return _session.analyze(nodes, edges)
+
+
+def fea_opensees_load_cases(nodes: list[Node], edges: list[Edge]) -> list[dict]:
+    # All load cases are analyzed in the domain of the shared session
+    global _session
+    if _session is None:
+        _session = OpenSeesSession()
+    return _session.analyze_load_cases(nodes, edges)
@@ -4,7 +4,7 @@ from PyNite import FEModel3D
 from utils.models import Edge, Node
 
 
-def fea_pynite(nodes: list[Node], edges: list[Edge]) -> dict:
+def build_pynite_model(nodes: list[Node], edges: list[Edge]) -> FEModel3D:
     truss = FEModel3D()
     truss.add_material("Custom", 1, 1, 1, 1)
 
@@ -57,9 +57,21 @@ def fea_pynite(nodes: list[Node], edges: list[Edge]) -> dict:
 
     # Add self weight of the beams
     # truss.add_member_self_weight("FY", -1)
+    return truss
+
 
+def analyze_pynite_model(truss: FEModel3D) -> None:
     truss.analyze(check_statics=True, sparse=False)
+
+
+def get_pynite_forces(truss: FEModel3D) -> dict:
     max_forces = {member.name: member.max_axial() for member in truss.Members.values()}
     if any(np.isnan(max_force) for max_force in max_forces.values()):
         raise Exception("At least one of the axial forces is nan")
     return max_forces
+
+
+def fea_pynite(nodes: list[Node], edges: list[Edge]) -> dict:
+    truss = build_pynite_model(nodes, edges)
+    analyze_pynite_model(truss)
+    return get_pynite_forces(truss)
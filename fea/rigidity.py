@@ -0,0 +1,164 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import ArpackError, eigsh, splu
+
+from fea.utils import DEFAULT_LOAD_CASE, get_load_case_names
+from utils.models import Edge, Node, TrussGraph
+
+# Relative size of a load below which it is treated as zero
+LOAD_TOLERANCE = 1e-11
+# Relative size of a squared singular value of the rigidity matrix below which
+# it is treated as zero
+RANK_TOLERANCE = 1e-11
+# Work of the loads on a unit mechanism relative to the largest load above
+# which the mechanism is excited, well above the error of the computed modes
+WORK_TOLERANCE = 1e-6
+
+
+def rigidity_matrix(graph: TrussGraph, free: np.ndarray):
+    """Sparse rigidity matrix of the pin-jointed truss, one row per member and
+    one column per free degree of freedom. Members of zero length have no row
+    entries."""
+    connectivity = graph.connectivity.astype(np.int64)
+    vectors = (
+        graph.coordinates[connectivity[:, 1]] - graph.coordinates[connectivity[:, 0]]
+    )
+    lengths = np.linalg.norm(vectors, axis=1)
+    directions = np.divide(
+        vectors,
+        lengths[:, None],
+        out=np.zeros_like(vectors),
+        where=lengths[:, None] > 0,
+    )
+    rows = np.repeat(np.arange(len(connectivity)), 6)
+    columns = (3 * connectivity[:, [0, 0, 0, 1, 1, 1]] + [0, 1, 2, 0, 1, 2]).ravel()
+    values = np.hstack([-directions, directions]).ravel()
+    # Columns of the supported degrees of freedom are dropped
+    dof_index = np.cumsum(free) - 1
+    keep = free[columns]
+    return coo_matrix(
+        (values[keep], (rows[keep], dof_index[columns[keep]])),
+        shape=(len(connectivity), np.count_nonzero(free)),
+    ).tocsc()
+
+
+def mechanism_modes(rigidity) -> np.ndarray:
+    """Orthonormal basis of the null space of the rigidity matrix as columns.
+
+    R^T R is factorized with symmetric pivoting first. Its pivots are not
+    smaller than its smallest eigenvalue, so without a small pivot R has full
+    rank. Otherwise the smallest eigenvalues of R^T R, the squared smallest
+    singular values of R, are computed with shift-invert around a small
+    negative shift, starting with one more than the number of small pivots or
+    Maxwell's count and doubling until one of them is not zero.
+    """
+    gram = (rigidity.T @ rigidity).tocsc()
+    n = gram.shape[0]
+    # The rows of R are unit vectors, so the eigenvalues are of the order of
+    # the largest diagonal entry
+    scale = max(gram.diagonal().max(initial=0), 1)
+    tolerance = RANK_TOLERANCE * scale
+    k = max(n - rigidity.shape[0], 0) + 1
+    try:
+        lu = splu(
+            gram,
+            permc_spec="MMD_AT_PLUS_A",
+            diag_pivot_thresh=0,
+            options={"SymmetricMode": True},
+        )
+        small_pivots = np.count_nonzero(np.abs(lu.U.diagonal()) <= tolerance)
+        if small_pivots == 0:
+            return np.zeros((n, 0))
+        k = max(k, small_pivots + 1)
+    except RuntimeError:
+        # An exactly zero pivot
+        pass
+    while True:
+        if 2 * k >= n:
+            values, vectors = np.linalg.eigh(gram.toarray())
+            break
+        try:
+            values, vectors = eigsh(gram, k=k, sigma=-1e-8 * scale)
+        except ArpackError:
+            # A cluster of zero eigenvalues larger than k may not converge
+            k *= 2
+            continue
+        if values.max() > tolerance:
+            break
+        k *= 2
+    return vectors[:, values <= tolerance]
+
+
+def excites_mechanism(loads: np.ndarray, modes: np.ndarray) -> bool:
+    """Whether the loads, one load case per column, do work on one of the
+    mechanism modes."""
+    work = loads.T @ modes
+    return bool(
+        np.any(
+            np.linalg.norm(work, axis=1)
+            > WORK_TOLERANCE * np.abs(loads).max(axis=0, initial=0)
+        )
+    )
+
+
+def find_mechanism(
+    nodes: list[Node], edges: list[Edge], numerical: bool = True
+) -> str | None:
+    """Reason why the loads excite a mechanism of the truss or None if none was found.
+
+    The topological checks find loaded nodes without members, loaded parts of
+    the truss without supports and loaded nodes held by one or two members
+    which cannot carry the load. Maxwell's count is necessary but not
+    sufficient for rigidity, so the numerical check computes the null space
+    of the rigidity matrix (the mechanisms of the pin-jointed truss) and
+    reports the loads which do work on one of them. Mechanisms which are not
+    excited by the loads are not reported.
+    """
+    graph = TrussGraph.from_nodes(nodes, edges)
+    connectivity = graph.connectivity.astype(np.int64)
+    support_dofs = graph.supported[:, None] & graph.t_supports
+    supported = support_dofs.any(axis=1)
+    # Loads of every load case and node, shape (cases, nodes, 3)
+    loads = np.array(
+        [
+            graph.get_loads(None if name == DEFAULT_LOAD_CASE else name)
+            for name in get_load_case_names(nodes)
+        ]
+    )
+    max_loads = np.abs(loads).max(axis=(1, 2), initial=0)
+    loaded = (np.abs(loads) > LOAD_TOLERANCE * max_loads[:, None, None]).any(
+        axis=(0, 2)
+    )
+    degree = np.bincount(connectivity.ravel(), minlength=len(nodes))
+
+    if np.any(loaded & ~supported & (degree == 0)):
+        return "A loaded node is not connected to any member"
+
+    adjacency = coo_matrix(
+        (np.ones(len(connectivity)), (connectivity[:, 0], connectivity[:, 1])),
+        shape=(len(nodes), len(nodes)),
+    )
+    _, labels = connected_components(adjacency, directed=False)
+    if not np.isin(labels[loaded], labels[supported]).all():
+        return "A loaded part of the truss is not supported"
+
+    # A node held by one or two members can only carry loads in the direction
+    # of its members (a line or a plane)
+    coordinates = graph.coordinates
+    for i in np.flatnonzero(loaded & ~supported & (degree < 3)):
+        members = connectivity[(connectivity == i).any(axis=1)]
+        directions = coordinates[members[:, 1]] - coordinates[members[:, 0]]
+        # Orthonormal basis of the directions, which may be collinear
+        basis, singular_values, _ = np.linalg.svd(directions.T, full_matrices=False)
+        basis = basis[:, singular_values > 1e-8 * singular_values.max()]
+        unbalanced = loads[:, i] - (loads[:, i] @ basis) @ basis.T
+        if np.any(np.linalg.norm(unbalanced, axis=1) > LOAD_TOLERANCE * max_loads):
+            return "A loaded node is held by too few members"
+
+    if numerical and np.count_nonzero(~support_dofs):
+        free = ~support_dofs.ravel()
+        modes = mechanism_modes(rigidity_matrix(graph, free))
+        if excites_mechanism(loads.reshape(len(loads), -1)[:, free].T, modes):
+            return "The loads excite a mechanism of the truss"
+    return None
@@ -1,22 +1,36 @@
+import os
+import tempfile
 import unittest
 
-from fea.openseespy import fea_opensees
+from fea.generators import GENERATORS, get_support
+from fea.openseespy import OpenSeesSession, fea_opensees, fea_opensees_session
 from fea.pynite import fea_pynite
+from fea.rigidity import find_mechanism
+from fea.truss import TrussSolution, fea_truss
+from fea.utils import (
+    ForceType,
+    check_members,
+    get_euler_load,
+    get_load_case_names,
+    get_load_case_nodes,
+    load_coefficients,
+)
+from utils.models import Edge, Node, Vector3
 from utils.parser import read_json
 
 test_cases = [
-    {"name": "beam_tower.json", "pynite": False, "openseespy": False},
-    {"name": "complex_pyramid.json", "pynite": True, "openseespy": True},
-    {"name": "complex_tower.json", "pynite": False, "openseespy": False},
-    {"name": "crane.json", "pynite": True, "openseespy": True},
-    {"name": "dino_without_hands.json", "pynite": True, "openseespy": True},
-    {"name": "dino.json", "pynite": True, "openseespy": False},  # self weight
-    {"name": "floating_point.json", "pynite": False, "openseespy": False},
-    {"name": "perpendicular_pyramid.json", "pynite": True, "openseespy": True},
-    {"name": "simple_pyramid.json", "pynite": True, "openseespy": True},
-    {"name": "single_beam.json", "pynite": False, "openseespy": False},
-    {"name": "sparse_tower.json", "pynite": False, "openseespy": False},
-    {"name": "triangle.json", "pynite": False, "openseespy": False},
+    {"name": "beam_tower.json", "pynite": False, "openseespy": False, "truss": False},
+    {"name": "complex_pyramid.json", "pynite": True, "openseespy": True, "truss": True},
+    {"name": "complex_tower.json", "pynite": False, "openseespy": False, "truss": False},
+    {"name": "crane.json", "pynite": True, "openseespy": True, "truss": True},
+    {"name": "dino_without_hands.json", "pynite": True, "openseespy": True, "truss": True},
+    {"name": "dino.json", "pynite": True, "openseespy": False, "truss": True},  # self weight
+    {"name": "floating_point.json", "pynite": False, "openseespy": False, "truss": False},
+    {"name": "perpendicular_pyramid.json", "pynite": True, "openseespy": True, "truss": True},
+    {"name": "simple_pyramid.json", "pynite": True, "openseespy": True, "truss": True},
+    {"name": "single_beam.json", "pynite": False, "openseespy": False, "truss": True},
+    {"name": "sparse_tower.json", "pynite": False, "openseespy": False, "truss": False},
+    {"name": "triangle.json", "pynite": False, "openseespy": False, "truss": False},
 ]
 
 
@@ -41,6 +55,312 @@ class TestFEA(unittest.TestCase):
                 else:
                     self.assertRaises(Exception, fea_opensees, nodes, edges)
 
+    def test_openseespy_session(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["openseespy"]:
+                    for edge in [None, *edges]:
+                        remaining_edges = [e for e in edges if e is not edge]
+                        try:
+                            max_forces = fea_opensees(nodes, remaining_edges)
+                        except Exception:
+                            self.assertRaises(
+                                Exception,
+                                fea_opensees_session,
+                                nodes,
+                                remaining_edges,
+                            )
+                            continue
+                        session_max_forces = fea_opensees_session(
+                            nodes, remaining_edges
+                        )
+                        max_abs = max(
+                            abs(session_max_forces[edge] - force)
+                            for edge, force in max_forces.items()
+                        )
+                        self.assertLessEqual(max_abs, 1e-8)
+
+    def test_openseespy_load_cases(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["openseespy"]:
+                    for node in nodes:
+                        if node.load:
+                            node.load_cases["double"] = node.load * 2
+                            node.load_cases["side"] = Vector3(
+                                node.load.y, node.load.x, node.load.z
+                            )
+                    session = OpenSeesSession()
+                    case_max_forces = session.analyze_load_cases(nodes, edges)
+                    tags = dict(session.nodes)
+                    # The domain is kept for all load cases and the next analysis
+                    session.analyze_load_cases(nodes, edges)
+                    self.assertEqual(session.nodes, tags)
+                    for name, max_forces in zip(
+                        get_load_case_names(nodes), case_max_forces
+                    ):
+                        reference_max_forces = fea_opensees(
+                            get_load_case_nodes(nodes, name), edges
+                        )
+                        max_abs = max(
+                            abs(max_forces[edge] - force)
+                            for edge, force in reference_max_forces.items()
+                        )
+                        self.assertLessEqual(max_abs, 1e-8)
+
+    def test_load_coefficients(self):
+        load_coefficients.cache_clear()
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as dirname:
+            os.chdir(dirname)
+            try:
+                coefficients = load_coefficients()
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(set(coefficients), {"material", "section_properties"})
+
+    def test_member_check(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    max_forces = fea_truss(nodes, edges)
+                    member_check = check_members(edges, max_forces)
+                    for i, edge in enumerate(edges):
+                        force_type = (
+                            ForceType.COMPRESSION
+                            if max_forces[edge.id] > 0
+                            else ForceType.TENSION
+                        )
+                        euler_load = get_euler_load(edge.length(), force_type)
+                        self.assertAlmostEqual(member_check.euler_loads[i], euler_load)
+                        self.assertEqual(
+                            member_check.breaking[i],
+                            abs(max_forces[edge.id]) > euler_load,
+                        )
+
+    def test_truss(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    self.assertIsInstance(fea_truss(nodes, edges), dict)
+                else:
+                    self.assertRaises(Exception, fea_truss, nodes, edges)
+
+    def test_truss_comparision(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    truss_max_forces = fea_truss(nodes, edges)
+                    references = []
+                    # The stiffness matrices of these models are singular for
+                    # PyNite, see test_pynite
+                    if test_case["pynite"] and file_name not in [
+                        "perpendicular_pyramid.json",
+                        "simple_pyramid.json",
+                    ]:
+                        references.append(fea_pynite(nodes, edges))
+                    if test_case["openseespy"]:
+                        references.append(fea_opensees(nodes, edges))
+                    for reference_max_forces in references:
+                        max_abs = max(
+                            abs(reference_max_forces[edge] - force)
+                            for edge, force in truss_max_forces.items()
+                        )
+                        self.assertLessEqual(max_abs, 10)
+
+    def test_truss_downdate(self):
+        downdates = 0
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    solution = TrussSolution(nodes, edges)
+                    downdated_solutions = solution.remove_edges(
+                        [edge.id for edge in edges]
+                    )
+                    for edge, downdated_solution in zip(edges, downdated_solutions):
+                        if downdated_solution is None:
+                            continue
+                        downdates += 1
+                        max_forces = fea_truss(
+                            nodes, [e for e in edges if e.id != edge.id]
+                        )
+                        max_abs = max(
+                            abs(downdated_solution.max_forces[edge] - force)
+                            for edge, force in max_forces.items()
+                        )
+                        self.assertLessEqual(max_abs, 1e-8)
+        self.assertGreater(downdates, 0)
+
+    def test_truss_mechanisms(self):
+        # A tetrahedron holds the loaded node, the joint between two supports
+        # can only carry loads along its members
+        supports = [
+            Node(f"support_{i}", vec, **get_support())
+            for i, vec in enumerate(
+                [Vector3(0, 0, 0), Vector3(2, 0, 0), Vector3(1, 0, 2)]
+            )
+        ]
+        loaded_node = Node("loaded", Vector3(1, 2, 1), load=Vector3(0, -1, 0))
+        edges = [Edge(f"edge_{i}", s, loaded_node) for i, s in enumerate(supports)]
+        max_forces = fea_truss(supports + [loaded_node], edges)
+        # Compression of the member between the first support and the joint
+        joint_loads = {
+            "unloaded joint": (Vector3(0, 0, 0), 0),
+            "load along the members": (Vector3(1, 0, 0), -0.5),
+            "load across the members": (Vector3(0, 1, 0), None),
+        }
+        for name, (load, joint_force) in joint_loads.items():
+            with self.subTest(name):
+                joint = Node("joint", Vector3(1, 0, 0), load=load)
+                nodes = supports + [loaded_node, joint]
+                joint_edges = [
+                    Edge("joint_0", supports[0], joint),
+                    Edge("joint_1", joint, supports[1]),
+                ]
+                if joint_force is None:
+                    self.assertIsNotNone(find_mechanism(nodes, edges + joint_edges))
+                    self.assertRaises(Exception, fea_truss, nodes, edges + joint_edges)
+                    continue
+                self.assertIsNone(find_mechanism(nodes, edges + joint_edges))
+                joint_max_forces = fea_truss(nodes, edges + joint_edges)
+                for edge, force in max_forces.items():
+                    self.assertAlmostEqual(joint_max_forces[edge], force)
+                self.assertAlmostEqual(joint_max_forces["joint_0"], joint_force)
+                self.assertAlmostEqual(joint_max_forces["joint_1"], -joint_force)
+        with self.subTest("node without members"):
+            nodes = supports + [loaded_node, Node("free", Vector3(3, 3, 3))]
+            self.assertIsNone(find_mechanism(nodes, edges))
+            self.assertEqual(fea_truss(nodes, edges), max_forces)
+
+    def test_truss_load_cases(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    for node in nodes:
+                        if node.load:
+                            node.load_cases["double"] = node.load * 2
+                            node.load_cases["side"] = Vector3(
+                                node.load.y, node.load.x, node.load.z
+                            )
+                    try:
+                        case_max_forces = [
+                            fea_truss(get_load_case_nodes(nodes, name), edges)
+                            for name in get_load_case_names(nodes)
+                        ]
+                    except Exception:
+                        self.assertRaises(Exception, TrussSolution, nodes, edges)
+                        continue
+                    solution = TrussSolution(nodes, edges)
+                    self.assertEqual(
+                        solution.load_case_names, ["default", "double", "side"]
+                    )
+                    for max_forces, solution_max_forces in zip(
+                        case_max_forces, solution.case_forces
+                    ):
+                        max_abs = max(
+                            abs(solution_max_forces[edge] - force)
+                            for edge, force in max_forces.items()
+                        )
+                        self.assertLessEqual(max_abs, 1e-6)
+
+    def test_find_mechanism(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    self.assertIsNone(find_mechanism(nodes, edges))
+                    loaded_node = next(
+                        node
+                        for node in nodes
+                        if node.load and not (node.r_support and node.t_support)
+                    )
+                    remaining_edges = [
+                        edge
+                        for edge in edges
+                        if loaded_node.id not in [edge.u.id, edge.v.id]
+                    ]
+                    self.assertIsNotNone(find_mechanism(nodes, remaining_edges))
+                    self.assertRaises(Exception, fea_truss, nodes, remaining_edges)
+
+        with self.subTest("Maxwell's count without rigidity"):
+            # Three members are enough for the three degrees of freedom of the
+            # loaded node, but they lie in the plane the load is normal to
+            supports = [
+                Node(f"support_{i}", vec, **get_support())
+                for i, vec in enumerate(
+                    [Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 1, 0)]
+                )
+            ]
+            loaded_node = Node("loaded", Vector3(1, 1, 0), load=Vector3(0, 0, -1))
+            nodes = supports + [loaded_node]
+            edges = [Edge(f"edge_{i}", s, loaded_node) for i, s in enumerate(supports)]
+            self.assertIsNotNone(find_mechanism(nodes, edges))
+            self.assertRaises(Exception, fea_truss, nodes, edges)
+            loaded_node.load = Vector3(1, 1, 0)
+            self.assertIsNone(find_mechanism(nodes, edges))
+
+    def test_generators(self):
+        for name, generator in GENERATORS.items():
+            for size in [2, 5]:
+                with self.subTest(f"{name} {size}"):
+                    nodes, edges = generator(size)
+                    self.assertIsNone(find_mechanism(nodes, edges))
+                    max_forces = fea_truss(nodes, edges)
+                    self.assertEqual(len(max_forces), len(edges))
+                    pynite_max_forces = fea_pynite(nodes, edges)
+                    max_abs = max(
+                        abs(pynite_max_forces[edge] - force)
+                        for edge, force in max_forces.items()
+                    )
+                    self.assertLessEqual(max_abs, 1e-6)
+
+    def test_truss_graph(self):
+        for test_case in test_cases:
+            with self.subTest(test_case):
+                file_name = test_case["name"]
+                nodes, edges = read_json(f"fea/models/{file_name}")
+                if test_case["truss"]:
+                    node_objects = {
+                        node.id: Node(
+                            node.id,
+                            node.vec,
+                            node.r_support,
+                            node.t_support,
+                            node.load,
+                            node.fixed,
+                        )
+                        for node in nodes
+                    }
+                    edge_objects = [
+                        Edge(edge.id, node_objects[edge.u.id], node_objects[edge.v.id])
+                        for edge in edges
+                    ]
+                    # Reversed order to use a reordered subgraph of the views
+                    max_forces = fea_truss(nodes[::-1], edges[::-1])
+                    object_max_forces = fea_truss(
+                        list(node_objects.values())[::-1], edge_objects[::-1]
+                    )
+                    max_abs = max(
+                        abs(object_max_forces[edge] - force)
+                        for edge, force in max_forces.items()
+                    )
+                    self.assertLessEqual(max_abs, 1e-9)
+
     def test_comparision(self):
         for test_case in test_cases:
             with self.subTest(test_case):
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import copy
+
+import numpy as np
+from scipy.linalg import qr
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import splu
+
+from fea.rigidity import excites_mechanism, mechanism_modes
+from fea.utils import DEFAULT_LOAD_CASE, get_load_case_names
+from utils.models import Edge, Node, TrussGraph
+
+# Relative amplification of the loads above which the structure is treated as a mechanism
+SINGULARITY_TOLERANCE = 1e-11
+# Relative pivot size below which the stiffness matrix is checked for mechanisms,
+# and a factorization without mechanisms is not used for downdates
+PIVOT_TOLERANCE = 1e-11
+# Remaining stiffness fraction of a removed member below which the removal creates a mechanism
+DOWNDATE_TOLERANCE = 1e-8
+# Number of downdates after which the stiffness matrix is factorized again
+MAX_DOWNDATES = 32
+
+
+def get_direction_cosines(
+    coordinates: np.ndarray, connectivity: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    delta = coordinates[connectivity[:, 1]] - coordinates[connectivity[:, 0]]
+    lengths = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+    return delta / lengths[:, None], lengths
+
+
+def get_element_dofs(connectivity: np.ndarray) -> np.ndarray:
+    # 3 translational degrees of freedom per node, (u_x, u_y, u_z, v_x, v_y, v_z)
+    return (3 * connectivity[:, [0, 0, 0, 1, 1, 1]] + np.tile([0, 1, 2], 2)).astype(
+        np.int64
+    )
+
+
+def assemble_stiffness(
+    num_dofs: int,
+    dofs: np.ndarray,
+    compatibility: np.ndarray,
+    stiffness: np.ndarray,
+):
+    # Compatibility vector b = [-c, c] of each member, K_e = k * b * b^T
+    element_matrices = (
+        stiffness[:, None, None] * compatibility[:, :, None] * compatibility[:, None, :]
+    )
+    rows = np.repeat(dofs, 6, axis=1).ravel()
+    cols = np.tile(dofs, (1, 6)).ravel()
+    return coo_matrix(
+        (element_matrices.ravel(), (rows, cols)),
+        shape=(num_dofs, num_dofs),
+    ).tocsc()
+
+
+def raise_singular():
+    raise Exception(
+        "The stiffness matrix is singular, which implies rigid body motion. The structure is unstable."
+    )
+
+
+def factorize(k_free):
+    try:
+        return splu(k_free)
+    except RuntimeError:
+        raise_singular()
+
+
+def get_pinned_dofs(modes: np.ndarray) -> np.ndarray:
+    # One DOF per mechanism mode, chosen by column pivoting so that the modes
+    # restricted to these DOFs are linearly independent
+    _, _, pivots = qr(modes.T, mode="economic", pivoting=True)
+    return np.sort(pivots[: modes.shape[1]])
+
+
+def is_excited_mechanism(
+    max_pivot: float, loads: np.ndarray, displacements: np.ndarray
+) -> bool:
+    # Mechanisms which are close to singular without a zero mode blow up the
+    # displacements if they are excited by the loads.
+    # Every column of the loads is a load case, which is checked on its own.
+    max_displacements = np.abs(displacements).max(axis=0, initial=0)
+    return bool(
+        np.any(
+            ~np.isfinite(max_displacements)
+            | (
+                max_displacements * max_pivot * SINGULARITY_TOLERANCE
+                > np.abs(loads).max(axis=0, initial=0)
+            )
+        )
+    )
+
+
+class TrussSolution:
+    """Pin-jointed truss analysis with 3 translational DOFs per node.
+
+    Members only carry axial forces, which are returned per edge id with
+    compression being positive (same convention as fea_pynite and fea_opensees).
+    The factorization is kept, so the solution of a truss with one member less
+    is derived with a rank-1 downdate (Sherman-Morrison) instead of a new solve.
+    All load cases are solved with the same factorization, one column each.
+
+    Mechanisms which the loads do not excite (e.g. unloaded collinear joints)
+    are accepted like in PyNite and fea.rigidity.find_mechanism. One DOF of
+    each is pinned, the loads do no work on the mechanisms, so the pins carry
+    no reactions and the axial forces are exact.
+    """
+
+    def __init__(
+        self, nodes: list[Node], edges: list[Edge], solve: bool = True
+    ) -> None:
+        graph = TrussGraph.from_nodes(nodes, edges)
+        coordinates = graph.coordinates
+        connectivity = graph.connectivity.astype(np.int64)
+        supported = (graph.supported[:, None] & graph.t_supports).ravel()
+        self.load_case_names = get_load_case_names(nodes)
+        loads = (
+            np.array(
+                [
+                    graph.get_loads(None if name == DEFAULT_LOAD_CASE else name)
+                    for name in self.load_case_names
+                ]
+            )
+            .reshape(len(self.load_case_names), -1)
+            .T
+        )
+
+        directions, lengths = get_direction_cosines(coordinates, connectivity)
+        self.edge_ids = graph.edge_ids
+        self.edge_mapping = {edge_id: i for i, edge_id in enumerate(self.edge_ids)}
+        # Same unit material and section as the simple PyNite model (E = A = 1)
+        self.stiffness = 1 / lengths
+        self.compatibility = np.hstack((-directions, directions))
+        self.dofs = get_element_dofs(connectivity)
+        self.free = np.flatnonzero(~supported)
+        # Position of every global DOF within the free DOFs, -1 for supported ones
+        self.free_mapping = np.full(len(supported), -1, dtype=np.int64)
+        self.free_mapping[self.free] = np.arange(len(self.free))
+        self.loads = loads[self.free]
+        self.active = np.ones(len(edges), dtype=bool)
+        if solve:
+            self.solve()
+
+    def assemble(self):
+        """Stiffness matrix of the active members restricted to the free DOFs."""
+        active = np.flatnonzero(self.active)
+        k = assemble_stiffness(
+            len(self.free_mapping),
+            self.dofs[active],
+            self.compatibility[active],
+            self.stiffness[active],
+        )
+        return k[self.free][:, self.free]
+
+    def rigidity(self):
+        """Rigidity matrix of the active members restricted to the free DOFs."""
+        active = np.flatnonzero(self.active)
+        free_dofs = self.free_mapping[self.dofs[active]]
+        rows, cols = np.nonzero(free_dofs >= 0)
+        return coo_matrix(
+            (self.compatibility[active][rows, cols], (rows, free_dofs[rows, cols])),
+            shape=(len(active), len(self.free)),
+        ).tocsc()
+
+    def _pin(self, dofs: np.ndarray) -> None:
+        # The arrays are replaced, copies of the solution share them
+        self.free = np.delete(self.free, dofs)
+        self.free_mapping = np.full(len(self.free_mapping), -1, dtype=np.int64)
+        self.free_mapping[self.free] = np.arange(len(self.free))
+        self.loads = np.delete(self.loads, dofs, axis=0)
+
+    def _factorize(self, k_free):
+        try:
+            lu = splu(k_free)
+            pivots = np.abs(lu.U.diagonal())
+            if pivots.min() > PIVOT_TOLERANCE * pivots.max():
+                return lu
+        except RuntimeError:
+            lu = None
+        # Zero or tiny pivots, the null space of the rigidity matrix tells the
+        # mechanisms apart from an ill-conditioned stiffness matrix
+        modes = mechanism_modes(self.rigidity())
+        if modes.shape[1] == 0:
+            if lu is None:
+                raise_singular()
+            return lu
+        if excites_mechanism(self.loads, modes):
+            raise_singular()
+        self._pin(get_pinned_dofs(modes))
+        if len(self.free) == 0:
+            return None
+        return factorize(self.assemble())
+
+    def solve(self, k_free=None) -> None:
+        if k_free is None:
+            k_free = self.assemble()
+        self.displacements = np.zeros((len(self.free_mapping), self.loads.shape[1]))
+        self.downdates = ()
+        self.lu = None
+        self.max_pivot = 0.0
+        self.is_stable = True
+        if len(self.free) > 0:
+            self.lu = self._factorize(k_free)
+        if self.lu is not None:
+            displacements = self.lu.solve(self.loads)
+            pivots = np.abs(self.lu.U.diagonal())
+            self.max_pivot = pivots.max()
+            if is_excited_mechanism(self.max_pivot, self.loads, displacements):
+                raise_singular()
+            self.is_stable = pivots.min() > PIVOT_TOLERANCE * self.max_pivot
+            self.displacements[self.free] = displacements
+
+    def _compatibility_vectors(self, indices: list[int]) -> np.ndarray:
+        # Compatibility vectors of the members restricted to the free DOFs, one per column
+        b = np.zeros((len(self.free), len(indices)))
+        free_dofs = self.free_mapping[self.dofs[indices]]
+        rows, cols = np.nonzero(free_dofs >= 0)
+        b[free_dofs[rows, cols], rows] = self.compatibility[indices][rows, cols]
+        return b
+
+    def _apply_inverse(self, b: np.ndarray) -> np.ndarray:
+        # K^-1 = K_0^-1 + sum(s * w * w^T) over all previous downdates
+        x = self.lu.solve(b)
+        for w, s in self.downdates:
+            x += s * np.outer(w, w @ b)
+        return x
+
+    def _refactorize(self) -> TrussSolution:
+        solution = copy.copy(self)
+        solution.solve()
+        return solution
+
+    def remove_edge(self, edge_id: str) -> TrussSolution | None:
+        """Solution without the given member or None if the downdate is not possible.
+
+        The downdate is not possible if the removal creates a mechanism or if the
+        factorization itself is close to singular. Then the truss has to be solved
+        from scratch to get the exact result (or exception) of the full analysis.
+        After MAX_DOWNDATES downdates the stiffness matrix is factorized again.
+        """
+        return self.remove_edges([edge_id])[0]
+
+    def remove_edges(self, edge_ids: list[str]) -> list[TrussSolution | None]:
+        """Solutions without each one of the given members, see remove_edge.
+
+        All removals share the factorization and are computed in one pass with
+        the compatibility vectors of the removed members as columns.
+        """
+        if self.lu is None or not self.is_stable:
+            return [None] * len(edge_ids)
+        if len(self.downdates) >= MAX_DOWNDATES:
+            return self._refactorize().remove_edges(edge_ids)
+
+        indices = [self.edge_mapping[edge_id] for edge_id in edge_ids]
+        b = self._compatibility_vectors(indices)
+        w = self._apply_inverse(b)
+        k = self.stiffness[indices]
+        # Fraction of the member stiffness which is not carried by the member itself,
+        # zero if the member is statically determinate
+        denominators = 1 - k * np.einsum("ij,ij->j", b, w)
+        valid = denominators >= DOWNDATE_TOLERANCE
+        s = np.divide(k, denominators, out=np.zeros_like(k), where=valid)
+        # Displacements of removal j and load case c in displacements[:, j, c]
+        displacements = self.displacements[self.free]
+        displacements = (
+            displacements[:, None, :]
+            + w[:, :, None] * (s[:, None] * (b.T @ displacements))[None]
+        )
+
+        solutions = []
+        for j, i in enumerate(indices):
+            if not valid[j] or is_excited_mechanism(
+                self.max_pivot, self.loads, displacements[:, j]
+            ):
+                solutions.append(None)
+                continue
+            solution = copy.copy(self)
+            solution.active = self.active.copy()
+            solution.active[i] = False
+            solution.displacements = np.zeros(self.displacements.shape)
+            solution.displacements[self.free] = displacements[:, j]
+            solution.downdates = self.downdates + ((w[:, j].copy(), s[j]),)
+            solutions.append(solution)
+        return solutions
+
+    @property
+    def case_forces(self) -> list[dict]:
+        """Axial forces of every load case in the order of load_case_names."""
+        active = np.flatnonzero(self.active)
+        elongations = np.einsum(
+            "ij,ijc->ic",
+            self.compatibility[active],
+            self.displacements[self.dofs[active]],
+        )
+        # Tension is positive for the elongation, the result uses compression as positive
+        axial_forces = -self.stiffness[active, None] * elongations
+        if np.isnan(axial_forces).any():
+            raise Exception("At least one of the axial forces is nan")
+        edge_ids = [self.edge_ids[i] for i in active]
+        return [dict(zip(edge_ids, forces.tolist())) for forces in axial_forces.T]
+
+    @property
+    def max_forces(self) -> dict:
+        return self.case_forces[0]
+
+
+def fea_truss(nodes: list[Node], edges: list[Edge]) -> dict:
+    return TrussSolution(nodes, edges).max_forces
@@ -1,12 +1,22 @@
 import math
+import os
+from functools import cache
+
+import numpy as np
 
 from utils.config import load_config
-from utils.models import Edge
+from utils.models import Edge, EdgeView, Node
+
+
+@cache
+def load_coefficients() -> dict:
+    # Relative to this module, so that scripts can run outside the repository root
+    return load_config(os.path.join(os.path.dirname(__file__), "coefficients.yaml"))
 
 
 class Material:
     def __init__(self) -> None:
-        config = load_config("fea/coefficients.yaml")
+        config = load_coefficients()
         args = config.get("material", {})
         self.e = args["e"]
         self.g = args["g"]
@@ -16,7 +26,7 @@ class Material:
 
 class SectionProperties:
     def __init__(self) -> None:
-        config = load_config("fea/coefficients.yaml")
+        config = load_coefficients()
         args = config.get("section_properties", {})
         self.iy = args["iy"]
         self.iz = args["iz"]
@@ -24,43 +34,96 @@ class SectionProperties:
         self.a = args["a"]
 
 
+# Name of the load case given by Node.load, the "forces" of the json format
+DEFAULT_LOAD_CASE = "default"
+
+
+def get_load_case_names(nodes: list[Node]) -> list[str]:
+    names = dict.fromkeys(name for node in nodes for name in node.load_cases)
+    return [DEFAULT_LOAD_CASE, *names]
+
+
+def get_load_case_nodes(nodes: list[Node], name: str) -> list[Node]:
+    # Copies of the nodes with the load of the given case as Node.load
+    if name == DEFAULT_LOAD_CASE:
+        return nodes
+    return [
+        Node(
+            id=node.id,
+            vec=node.vec,
+            r_support=node.r_support,
+            t_support=node.t_support,
+            load=node.load_cases.get(name),
+            fixed=node.fixed,
+            load_cases=node.load_cases,
+        )
+        for node in nodes
+    ]
+
+
 class ForceType:
     TENSION = "TENSION"
     COMPRESSION = "COMPRESSION"
 
 
+# gravitational acceleration and load-bearing capacity for a beam with 1m length in kg
+COMPRESSION_CAPACITY = 35
+TENSION_CAPACITY = 700
+
+
 def get_euler_load(l: float, force_type: ForceType) -> float:
     if force_type == ForceType.COMPRESSION:
-        # gravitational acceleration and load-bearing capacity for a beam with 1m length in kg
-        return 35 / math.pow(l, 2)
-    return 700
-
-
-def get_breaking_compression_tension_edges(
-    edges: list[Edge], max_forces: dict
-) -> list[dict]:
-    edges = get_all_compression_tension_edges(edges, max_forces)
-    force_edges = []
-    for edge in edges:
-        if abs(edge["max_force"]) > edge["euler_load"]:
-            force_edges.append(edge)
-    return force_edges
-
-
-def get_all_compression_tension_edges(
-    edges: list[Edge], max_forces: dict
-) -> list[dict]:
-    force_edges = []
-    for edge in edges:
-        max_force = max_forces[edge.id]
-        force_type = ForceType.COMPRESSION if max_force > 0 else ForceType.TENSION
-        euler_load = get_euler_load(l=edge.length(), force_type=force_type)
-        force_edges.append(
-            {
-                "id": edge.id,
-                "force_type": force_type,
-                "max_force": max_force,
-                "euler_load": euler_load,
-            }
+        return COMPRESSION_CAPACITY / math.pow(l, 2)
+    return TENSION_CAPACITY
+
+
+def get_edge_lengths(edges: list[Edge]) -> np.ndarray:
+    graph = edges[0].graph if edges and isinstance(edges[0], EdgeView) else None
+    if graph is not None and all(
+        isinstance(edge, EdgeView) and edge.graph is graph for edge in edges
+    ):
+        connectivity = graph.connectivity[[edge.index for edge in edges]]
+        coordinates = graph.coordinates[connectivity].reshape(-1, 6)
+    else:
+        coordinates = np.array(
+            [[*edge.u.to_array(), *edge.v.to_array()] for edge in edges],
+            dtype=np.float64,
+        ).reshape(-1, 6)
+    delta = coordinates[:, 3:] - coordinates[:, :3]
+    return np.sqrt(np.einsum("ij,ij->i", delta, delta))
+
+
+class MemberCheck:
+    """Check of all members against their euler load in one pass.
+
+    Axial forces use compression as positive, like the results of the FEA.
+    """
+
+    def __init__(self, lengths: np.ndarray, max_forces: np.ndarray) -> None:
+        self.max_forces = max_forces
+        self.compression = max_forces > 0
+        self.tension = ~self.compression
+        self.euler_loads = np.where(
+            self.compression, COMPRESSION_CAPACITY / lengths**2, TENSION_CAPACITY
+        )
+        self.ratios = np.abs(max_forces) / self.euler_loads
+        self.breaking = np.abs(max_forces) > self.euler_loads
+        self.failed = bool(self.breaking.any())
+
+
+def check_members(edges: list[Edge], max_forces: dict) -> MemberCheck:
+    return MemberCheck(
+        get_edge_lengths(edges),
+        np.array([max_forces[edge.id] for edge in edges], dtype=np.float64),
+    )
+
+
+def check_load_cases(edges: list[Edge], case_forces: list[dict]) -> list[MemberCheck]:
+    lengths = get_edge_lengths(edges)
+    return [
+        MemberCheck(
+            lengths,
+            np.array([max_forces[edge.id] for edge in edges], dtype=np.float64),
         )
-    return force_edges
+        for max_forces in case_forces
+    ]
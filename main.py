@@ -6,9 +6,14 @@ from search import ucts
 def main() -> None:
     parser = ArgumentParser()
     parser.add_argument("--config_file", type=str)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the search from its last checkpoint up to max_iter",
+    )
     args = parser.parse_args()
 
-    ucts.execute(config_file=args.config_file)
+    ucts.execute(config_file=args.config_file, resume=args.resume)
 
 
 if __name__ == "__main__":
@@ -68,29 +68,28 @@ class RemoveEdgeAction(AbstractAction):
         edge: Edge,
     ):
         self.edge = edge
+        # FEA result of the new state if it was evaluated in advance
+        self.fea_solution = None
+        self.fea_score = None
 
     def execute(self, state):
-        new_state = state.deep_copy()
-        new_state.edges = [edge for edge in new_state.edges if edge.id != self.edge.id]
-        # # remove node if it is not connected to any edge
-        nodes = [self.edge.u, self.edge.v]
-        for edge_node in nodes:
-            if not any(
-                [
-                    edge
-                    for edge in new_state.edges
-                    if edge.u.id == edge_node.id or edge.v.id == edge_node.id
-                ]
-            ):
-                if edge_node.fixed or edge_node.load:
-                    continue
-                new_state.nodes = [
-                    node for node in new_state.nodes if node.id != edge_node.id
-                ]
-
-        new_state.iteration += 1
+        new_state = state.copy()
+        new_state.fea_solution = state.fea_solution
+        self.apply(new_state)
         return new_state
 
+    def apply(self, state):
+        """Removes the edge from the state itself instead of a copy."""
+        parent_fea_solution = state.fea_solution
+        state.remove_edge(self.edge)
+        state.fea_score = self.fea_score
+        state.fea_solution = self.fea_solution
+        state.parent_fea_solution = None
+        if self.fea_solution is None and parent_fea_solution is not None:
+            state.parent_fea_solution = (parent_fea_solution, self.edge.id)
+
+        state.iteration += 1
+
 
 class AddEdgeWithNewNodeAction(AbstractAction):
     def __init__(
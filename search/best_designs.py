@@ -0,0 +1,73 @@
+import heapq
+import json
+import os
+
+from utils.parser import get_json
+
+
+class BestDesigns:
+    """Bounded heap of the k best designs found by the rollouts of a search.
+
+    The heap is updated after every rollout, so the best designs are known at
+    any time without walking the tree. Every design which enters the k best is
+    appended to the JSONL file, if there is one, as soon as it is found. The
+    file is only cleared if the search is not resumed.
+
+    A design keeps the score its node had when it was added, the score of the
+    node changes with later rollouts of the node.
+    """
+
+    def __init__(
+        self, k: int, filename: str | None = None, append: bool = False
+    ) -> None:
+        self.k = k
+        self.filename = filename
+        # (score, node index, node), the worst of the k designs first
+        self.heap = []
+        # iteration of the last change of the k best designs
+        self.last_update = 0
+        if filename is not None:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            if not append:
+                open(filename, "w").close()
+
+    def update(self, node, iteration: int) -> bool:
+        """Adds the node if its score is one of the k best, returns whether it was."""
+        score = node.score
+        if not self._push(node):
+            return False
+        self.last_update = iteration
+        if self.filename is not None:
+            design = {"iteration": iteration, "score": score}
+            design.update(get_json(node.state.nodes, node.state.edges))
+            with open(self.filename, "a") as f:
+                f.write(json.dumps(design) + "\n")
+        return True
+
+    def _push(self, node) -> bool:
+        for i, (score, index, _) in enumerate(self.heap):
+            if index == node.index:
+                if node.score <= score:
+                    return False
+                self.heap[i] = (node.score, node.index, node)
+                heapq.heapify(self.heap)
+                break
+        else:
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, (node.score, node.index, node))
+            elif node.score > self.heap[0][0]:
+                heapq.heapreplace(self.heap, (node.score, node.index, node))
+            else:
+                return False
+        return True
+
+    def add_nodes(self, nodes, iteration: int) -> None:
+        # Only the k best of the nodes are added, e.g. of a resumed tree. They
+        # are not written, the designs of a resumed tree are in the file already
+        for node in heapq.nlargest(self.k, nodes, key=lambda n: (n.score, n.index)):
+            if self._push(node):
+                self.last_update = iteration
+
+    def get(self) -> list:
+        """(score, node) of the k best designs in ascending order of their score."""
+        return [(score, node) for score, _, node in sorted(self.heap)]
@@ -0,0 +1,146 @@
+import json
+import os
+
+import numpy as np
+
+from search.action import RemoveEdgeAction
+from search.config import UCTSConfig
+from search.ground_structure import GroundStructure
+from search.state import State
+from search.truss_search_tree import TreeSearchNode, TrussSearchTree
+from utils.models import TrussGraph, Vector3
+
+
+def save_graph(graph: TrussGraph, filename: str) -> None:
+    load_cases = [
+        {name: [load.x, load.y, load.z] for name, load in cases.items()}
+        for cases in graph.load_cases
+    ]
+    np.savez(
+        filename,
+        node_ids=np.array(graph.node_ids),
+        coordinates=graph.coordinates,
+        edge_ids=np.array(graph.edge_ids),
+        connectivity=graph.connectivity,
+        supported=graph.supported,
+        r_supports=graph.r_supports,
+        t_supports=graph.t_supports,
+        loaded=graph.loaded,
+        loads=graph.loads,
+        fixed=graph.fixed,
+        load_cases=np.array(json.dumps(load_cases)),
+    )
+
+
+def load_graph(filename: str) -> TrussGraph:
+    with np.load(filename) as data:
+        return TrussGraph(
+            node_ids=data["node_ids"].tolist(),
+            coordinates=data["coordinates"],
+            edge_ids=data["edge_ids"].tolist(),
+            connectivity=data["connectivity"],
+            supported=data["supported"],
+            r_supports=data["r_supports"],
+            t_supports=data["t_supports"],
+            loaded=data["loaded"],
+            loads=data["loads"],
+            fixed=data["fixed"],
+            load_cases=[
+                {name: Vector3(*load) for name, load in cases.items()}
+                for cases in json.loads(str(data["load_cases"]))
+            ],
+        )
+
+
+class Checkpoint:
+    """Search tree on disk, which is written while the search runs.
+
+    The ground structure is written once. Every node of the tree is a link
+    (parent index, child index, edge index) in an append-only file, a link to
+    an existing child is a transposition. The visits, rewards and scores of
+    all nodes are replaced at every checkpoint. States are not stored, they
+    are replayed from the ground structure and the removed edges.
+    """
+
+    def __init__(self, dirname: str) -> None:
+        self.dirname = dirname
+        self.graph_file = os.path.join(dirname, "ground_structure.npz")
+        self.links_file = os.path.join(dirname, "links.bin")
+        self.statistics_file = os.path.join(dirname, "statistics.npz")
+        self.num_links = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.statistics_file)
+
+    def create(self, tree: TrussSearchTree) -> None:
+        os.makedirs(self.dirname, exist_ok=True)
+        state = tree.root.state
+        save_graph(state.ground_structure.graph, self.graph_file)
+        open(self.links_file, "wb").close()
+        self.num_links = 0
+        tree.new_links = []
+        self.save(tree, 0)
+
+    def save(self, tree: TrussSearchTree, iterations: int) -> None:
+        """Appends the new links of the tree and replaces its statistics."""
+        with open(self.links_file, "ab") as f:
+            np.array(tree.new_links, dtype=np.int32).reshape(-1, 3).tofile(f)
+        self.num_links += len(tree.new_links)
+        tree.new_links = []
+
+        statistics = tree.statistics
+        scores = np.zeros(statistics.size)
+        for node in tree.transpositions.values():
+            scores[node.index] = node.score
+        # Written to a temporary file first, so that a killed search keeps the
+        # last complete checkpoint
+        temporary_file = os.path.join(self.dirname, "statistics.tmp.npz")
+        np.savez(
+            temporary_file,
+            iterations=iterations,
+            num_links=self.num_links,
+            max_total_edge_length=tree.root.state.max_total_edge_length,
+            visits=statistics.visits[: statistics.size],
+            results=statistics.results[: statistics.size],
+            scores=scores,
+        )
+        os.replace(temporary_file, self.statistics_file)
+
+    def load(self, config: UCTSConfig) -> tuple[TrussSearchTree, int]:
+        """Tree of the last checkpoint and the number of its iterations."""
+        with np.load(self.statistics_file) as data:
+            statistics = {key: data[key] for key in data.files}
+        # Links after the last statistics belong to an unfinished checkpoint
+        self.num_links = int(statistics["num_links"])
+        links = np.fromfile(self.links_file, dtype=np.int32, count=3 * self.num_links)
+        with open(self.links_file, "r+b") as f:
+            f.truncate(links.nbytes)
+
+        ground_structure = GroundStructure(load_graph(self.graph_file))
+        state = State(config=config, nodes=[], edges=[])
+        state.set_ground_structure(ground_structure)
+        state.max_total_edge_length = float(statistics["max_total_edge_length"])
+        tree = TrussSearchTree(TreeSearchNode(state=state, parent=None))
+        nodes = [tree.root]
+        for parent, child, edge in links.reshape(-1, 3).tolist():
+            if child == len(nodes):
+                action = RemoveEdgeAction(ground_structure.edges[edge])
+                node = TreeSearchNode(
+                    state=nodes[parent].state.move(action), parent=nodes[parent]
+                )
+                tree.transpositions[node.state.get_topology_key()] = node
+                nodes.append(node)
+            nodes[parent].children.append(nodes[child])
+
+        size = len(nodes)
+        tree.statistics.visits[:size] = statistics["visits"][:size]
+        tree.statistics.results[:size] = statistics["results"][:size]
+        for node in nodes:
+            node.score = float(statistics["scores"][node.index])
+            if node.children:
+                # Untried actions are popped from the end of the legal actions
+                actions = node.state.get_legal_actions()
+                node._untried_actions = actions[: len(actions) - len(node.children)]
+        tree.new_links = []
+        tree.iterations = int(statistics["iterations"])
+        return tree, int(statistics["iterations"])
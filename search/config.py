@@ -25,3 +25,35 @@ class UCTSConfig:
         self.num_neighbors = args["num_neighbors"]
         self.clamp_tolerance = args["clamp_tolerance"]
         self.max_edge_len = args["max_edge_len"]
+        # nodes further apart are not connected as neighbors, None for any distance
+        self.max_neighbor_distance = args.get("max_neighbor_distance")
+        self.fea = args.get("fea", "simple")
+        # maximum number of entries (fea scores, not bytes) in the score cache, 0
+        # disables it
+        self.score_cache_size = args.get("score_cache_size", 100000)
+        # number of processes which run the fea of the children, 1 runs it in the search process
+        self.num_workers = args.get("num_workers", 1)
+        # number of rollouts of the tree which wait for their fea at the same time
+        self.num_pending = args.get("num_pending", 1)
+        # reward subtracted from the path of a pending rollout
+        self.virtual_loss = args.get("virtual_loss", 1.0)
+        # remove the members with the lowest utilisation of a node first
+        self.order_actions = args.get("order_actions", False)
+        # a node with n visits has at most widening_constant * n ** widening_exponent
+        # children, 0 expands all children before descending
+        self.widening_constant = args.get("widening_constant", 0)
+        self.widening_exponent = args.get("widening_exponent", 0.5)
+        # seconds after which the search stops, None for no limit
+        self.time_limit = args.get("time_limit")
+        # iterations without a new one of the k best designs after which the
+        # search stops, 0 for no limit
+        self.patience = args.get("patience", 0)
+        # iterations between checkpoints of the tree, 0 disables them
+        self.checkpoint_interval = args.get("checkpoint_interval", 0)
+        # number of trees grown in parallel processes, which share max_iter
+        self.num_trees = args.get("num_trees", 1)
+        # iterations between merges of the root statistics of the trees, 0 only at the end
+        self.sync_interval = args.get("sync_interval", 0)
+        # seed of the search and of its first tree, the others use the following
+        # seeds, None for a random seed
+        self.seed = args.get("seed")
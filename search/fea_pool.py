@@ -0,0 +1,67 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from fea.backends import fea_load_cases
+from utils.models import Edge, Node
+
+# Ground structure and backend of a worker process, set by _init_worker
+_worker_fea = None
+_worker_nodes = {}
+_worker_edges = {}
+
+
+def _init_worker(fea: str, nodes: list[Node], edges: list[Edge]) -> None:
+    global _worker_fea, _worker_nodes, _worker_edges
+    # Every worker keeps its own backend, e.g. the OpenSees domain of its process
+    _worker_fea = fea
+    _worker_nodes = {node.id: node for node in nodes}
+    _worker_edges = {edge.id: edge for edge in edges}
+
+
+def _run_fea(node_ids: list[str], edge_ids: list[str]) -> list[dict]:
+    return fea_load_cases(
+        _worker_fea,
+        [_worker_nodes[node_id] for node_id in node_ids],
+        [_worker_edges[edge_id] for edge_id in edge_ids],
+    )
+
+
+class FEAPool:
+    """Worker processes which run the FEA of topologies of a ground structure.
+
+    The ground structure is sent to every worker once, jobs only contain the
+    ids of the remaining nodes and edges. The member forces of all load cases
+    are returned as futures, exceptions of the FEA are raised by Future.result.
+    """
+
+    def __init__(self) -> None:
+        self.executor = None
+
+    def start(
+        self, fea: str, nodes: list[Node], edges: list[Edge], num_workers: int
+    ) -> None:
+        self.shutdown()
+        # The truss FEA downdates the factorization of the parent in the search
+        # process, so it does not use the workers
+        if num_workers > 1 and fea != "truss":
+            self.executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_init_worker,
+                initargs=(fea, nodes, edges),
+            )
+
+    def is_running(self) -> bool:
+        return self.executor is not None
+
+    def submit(self, nodes: list[Node], edges: list[Edge]) -> Future:
+        return self.executor.submit(
+            _run_fea, [node.id for node in nodes], [edge.id for edge in edges]
+        )
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+# Shared by all states of a search, started from UCTSConfig in search.ucts
+fea_pool = FEAPool()
@@ -0,0 +1,78 @@
+import uuid
+
+import numpy as np
+
+from utils.coordinate_index import CoordinateIndex
+from utils.models import EdgeView, Node, NodeView, TrussGraph
+
+
+def get_edge_pair(u: Node, v: Node) -> tuple[str, str]:
+    # Node ids of an edge in either direction
+    return (u.id, v.id) if u.id < v.id else (v.id, u.id)
+
+
+def get_indices(mask: int, size: int) -> np.ndarray:
+    # Bit i of the mask selects item i
+    bits = np.unpackbits(
+        np.frombuffer(mask.to_bytes((size + 7) // 8, "little"), dtype=np.uint8),
+        bitorder="little",
+    )
+    return np.flatnonzero(bits[:size])
+
+
+class GroundStructure:
+    """Nodes and candidate members shared by all states of a search.
+
+    A state selects its nodes and edges with integer bitmasks, so that a child
+    only differs from its parent by the cleared bits of the removed edge and
+    of the nodes which are left without members.
+    """
+
+    def __init__(self, graph: TrussGraph) -> None:
+        self.graph = graph
+        # Distinguishes the masks of different ground structures in the score cache
+        self.token = uuid.uuid4().bytes
+        self.nodes: list[NodeView] = graph.nodes
+        self.edges: list[EdgeView] = graph.edges
+        self.node_index = CoordinateIndex()
+        for node in self.nodes:
+            self.node_index.add(node)
+        self.all_nodes = (1 << len(self.nodes)) - 1
+        self.all_edges = (1 << len(self.edges)) - 1
+        # Total lengths of the states are summed from their masks, so that they
+        # do not depend on the order of the removals
+        self.lengths = np.array([edge.length() for edge in self.edges])
+        self.edge_pairs = {
+            get_edge_pair(edge.u, edge.v): i for i, edge in enumerate(self.edges)
+        }
+        # Mask of the edges of every node
+        self.node_edges = [0] * len(self.nodes)
+        for i, (u, v) in enumerate(graph.connectivity.tolist()):
+            self.node_edges[u] |= 1 << i
+            self.node_edges[v] |= 1 << i
+
+    def get_nodes(self, mask: int) -> list[NodeView]:
+        return [self.nodes[i] for i in get_indices(mask, len(self.nodes))]
+
+    def get_edges(self, mask: int) -> list[EdgeView]:
+        return [self.edges[i] for i in get_indices(mask, len(self.edges))]
+
+    def total_length(self, mask: int) -> float:
+        return float(self.lengths[get_indices(mask, len(self.edges))].sum())
+
+    def remove_edge(
+        self, node_mask: int, edge_mask: int, edge: EdgeView
+    ) -> tuple[int, int]:
+        """Masks without the edge and without its nodes if they are left without
+        members, unless they are fixed or loaded."""
+        edge_mask &= ~(1 << edge.index)
+        for node in [edge.u, edge.v]:
+            if edge_mask & self.node_edges[node.index]:
+                continue
+            if node.fixed or node.load:
+                continue
+            node_mask &= ~(1 << node.index)
+        return node_mask, edge_mask
+
+    def __deepcopy__(self, memo):
+        return self
@@ -0,0 +1,173 @@
+import math
+import multiprocessing
+import random
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from search.config import UCTSConfig
+from search.rigidity_check import rigidity_check
+from search.state import State
+from search.truss_search_tree import TreeSearchNode, TrussSearchTree
+
+# A design is the score and the node and edge masks of a state of the ground structure
+Design = tuple[float, int, int]
+
+
+def get_root_statistics(tree: TrussSearchTree) -> dict[int, tuple[float, float]]:
+    # Children of the root are identified by their edge mask in every tree
+    return {child.state.edge_mask: (child.n, child.q) for child in tree.root.children}
+
+
+def get_best_designs(tree: TrussSearchTree, k: int) -> list[Design]:
+    designs = {}
+    for node in tree.get_nodes():
+        design = (node.score, node.state.node_mask, node.state.edge_mask)
+        designs[node.state.edge_mask] = max(
+            design, designs.get(node.state.edge_mask, design)
+        )
+    return sorted(designs.values())[-k:]
+
+
+def merge_statistics(
+    statistics: list[dict[int, tuple[float, float]]],
+) -> dict[int, tuple[float, float]]:
+    merged = {}
+    for tree_statistics in statistics:
+        for key, (n, q) in tree_statistics.items():
+            merged_n, merged_q = merged.get(key, (0.0, 0.0))
+            merged[key] = (merged_n + n, merged_q + q)
+    return merged
+
+
+def merge_designs(designs: list[list[Design]], k: int) -> list[Design]:
+    merged = {}
+    for design in sorted(design for tree_designs in designs for design in tree_designs):
+        merged[design[2]] = design
+    return sorted(merged.values())[-k:]
+
+
+def _run_tree(
+    state: State,
+    seed: int,
+    iterations: int,
+    sync_interval: int,
+    num_syncs: int,
+    k: int,
+    num_trees: int,
+    show_progress: bool,
+    connection: Connection,
+) -> None:
+    try:
+        random.seed(seed)
+        np.random.seed(seed)
+        # Every process has its own rigidity check, and its own score cache in the
+        # unpickled state
+        rigidity_check.clear()
+
+        tree = TrussSearchTree(TreeSearchNode(state=state, parent=None))
+        done = 0
+        for sync in range(num_syncs):
+            simulations = min(sync_interval, iterations - done)
+            tree.simulate(simulations, show_progress=show_progress)
+            done += simulations
+            connection.send((get_root_statistics(tree), get_best_designs(tree, k)))
+            if sync < num_syncs - 1:
+                # The root children continue with the mean statistics of all trees
+                merged = connection.recv()
+                statistics = tree.statistics
+                for child in tree.root.children:
+                    if child.state.edge_mask in merged:
+                        n, q = merged[child.state.edge_mask]
+                        statistics.visits[child.index] = n / num_trees
+                        statistics.results[child.index] = q / num_trees
+                statistics.visits[tree.root.index] = max(
+                    tree.root.n, sum(child.n for child in tree.root.children)
+                )
+        connection.send((str(state.score_cache), str(rigidity_check)))
+    except Exception as e:
+        # The search process raises the exception of the tree
+        connection.send(e)
+    finally:
+        connection.close()
+
+
+def _receive(connection: Connection, tree: int):
+    try:
+        result = connection.recv()
+    except EOFError:
+        raise RuntimeError(f"Tree {tree} exited without sending its results") from None
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def simulate_root_parallel(
+    state: State, config: UCTSConfig, k: int
+) -> tuple[dict[int, tuple[float, float]], list[Design]]:
+    """Grows config.num_trees independent trees from the state in separate processes.
+
+    The config.max_iter iterations are split between the trees, which run them
+    with their own seeds. Every config.sync_interval iterations, and at the end,
+    the visit counts and rewards of the root children and the k best designs
+    of all trees are merged. Returns the merged root statistics, keyed by the
+    edge mask of the child, and the k best designs in ascending order of their
+    score. If a tree raises an exception, the other trees are terminated and
+    the exception is raised.
+    """
+    seed = config.seed if config.seed is not None else random.randrange(2**32)
+    # The first trees run one more iteration if max_iter is not divisible
+    iterations = [
+        config.max_iter // config.num_trees + (i < config.max_iter % config.num_trees)
+        for i in range(config.num_trees)
+    ]
+    sync_interval = config.sync_interval or max(iterations[0], 1)
+    num_syncs = max(math.ceil(iterations[0] / sync_interval), 1)
+    connections = []
+    processes = []
+    try:
+        for i in range(config.num_trees):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_tree,
+                args=(
+                    state,
+                    seed + i,
+                    iterations[i],
+                    sync_interval,
+                    num_syncs,
+                    k,
+                    config.num_trees,
+                    i == 0,
+                    worker_connection,
+                ),
+            )
+            process.start()
+            # Only the tree holds its end, so that the pipe is closed if it exits
+            worker_connection.close()
+            connections.append(connection)
+            processes.append(process)
+
+        for sync in range(num_syncs):
+            results = [
+                _receive(connection, i) for i, connection in enumerate(connections)
+            ]
+            statistics = merge_statistics([result[0] for result in results])
+            designs = merge_designs([result[1] for result in results], k)
+            if sync < num_syncs - 1:
+                for connection in connections:
+                    connection.send(statistics)
+        for i, connection in enumerate(connections):
+            cache, rigidity = _receive(connection, i)
+            print(f"tree {i}: {cache}, {rigidity}")
+    except BaseException:
+        # The other trees may wait for the merged statistics
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+        for connection in connections:
+            connection.close()
+    return statistics, designs
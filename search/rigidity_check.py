@@ -0,0 +1,34 @@
+from fea.rigidity import find_mechanism
+from utils.models import Edge, Node
+
+
+class RigidityCheck:
+    """Rejects trusses with excited mechanisms before their FEA is run.
+
+    The numerical check is skipped for the truss FEA, which detects the
+    mechanisms itself with the same effort.
+    """
+
+    def __init__(self) -> None:
+        self.checks = 0
+        self.saved_fea_calls = 0
+
+    def clear(self) -> None:
+        self.checks = 0
+        self.saved_fea_calls = 0
+
+    def rejects(self, fea: str, nodes: list[Node], edges: list[Edge]) -> bool:
+        self.checks += 1
+        if find_mechanism(nodes, edges, numerical=fea != "truss") is None:
+            return False
+        self.saved_fea_calls += 1
+        return True
+
+    def __str__(self) -> str:
+        return (
+            f"rigidity check: {self.saved_fea_calls} of {self.checks} fea calls saved"
+        )
+
+
+# Shared by all states of a search, cleared in search.ucts
+rigidity_check = RigidityCheck()
@@ -0,0 +1,68 @@
+import hashlib
+from collections import OrderedDict
+
+from utils.models import Edge
+
+
+def get_topology_key(fea: str, edges: list[Edge]) -> bytes:
+    # Different removal orders reach the same edge set, so the key only depends on
+    # the sorted node id pairs. A digest keeps the memory per entry small.
+    pairs = sorted("-".join(sorted((edge.u.id, edge.v.id))) for edge in edges)
+    return hashlib.blake2b("|".join([fea, *pairs]).encode(), digest_size=16).digest()
+
+
+def get_mask_key(fea: str, token: bytes, edge_mask: int) -> bytes:
+    # States of one ground structure (its token) are keyed by their edge mask
+    mask = edge_mask.to_bytes((edge_mask.bit_length() + 7) // 8, "little")
+    return hashlib.blake2b(fea.encode() + token + mask, digest_size=16).digest()
+
+
+class ScoreCache:
+    """Least recently used cache of fea scores keyed by the topology of a state.
+
+    The size is counted in scores, not in bytes, an entry with its 16 byte key
+    takes about 180 bytes. A search creates one cache with its root state,
+    which is shared by all copies of the state.
+    """
+
+    def __init__(self, max_size: int = 100000) -> None:
+        self.max_size = max_size
+        self.scores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        self.scores.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> float | None:
+        score = self.scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.scores.move_to_end(key)
+        return score
+
+    def put(self, key: bytes, score: float) -> None:
+        if self.max_size <= 0:
+            return
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        while len(self.scores) > self.max_size:
+            self.scores.popitem(last=False)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0
+        return (
+            f"score cache: {len(self)} entries, {self.hits} hits, "
+            f"{self.misses} misses ({hit_rate:.1%} hit rate)"
+        )
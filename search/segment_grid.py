@@ -0,0 +1,171 @@
+import itertools
+import math
+from collections import defaultdict
+
+import numpy as np
+
+# Tolerance of math.isclose, which skspatial uses for parallel directions and
+# for points on a segment
+REL_TOL = 1e-9
+# A point counts as on a segment if it is within about sqrt(2 * REL_TOL) times
+# the segment length beside it, the bounding boxes are padded by more than that
+PADDING = 1e-4
+
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+
+def _cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Same operations as np.cross, without its axis handling
+    return np.stack(
+        [
+            a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+            a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+            a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0],
+        ],
+        axis=1,
+    )
+
+
+def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.clip(_dot(a, b) / (np.sqrt(_dot(a, a)) * np.sqrt(_dot(b, b))), -1, 1)
+
+
+def _contains(p0: np.ndarray, p1: np.ndarray, points: np.ndarray) -> np.ndarray:
+    to_p0 = p0 - points
+    to_p1 = p1 - points
+    return (
+        (_dot(to_p0, to_p0) == 0)
+        | (_dot(to_p1, to_p1) == 0)
+        | (np.abs(_cosine_similarity(to_p0, to_p1) + 1) <= REL_TOL)
+    )
+
+
+def _are_coplanar(points: np.ndarray) -> np.ndarray:
+    # Affine rank of the four points of every pair of segments
+    coplanar = np.zeros(len(points), dtype=bool)
+    for i, j in itertools.combinations(range(4), 2):
+        # Less than four distinct points are always coplanar
+        coplanar |= (points[:, i] == points[:, j]).all(axis=1)
+    distinct = points[~coplanar]
+    centered = distinct - distinct.mean(axis=1, keepdims=True)
+    singular_values = np.linalg.svd(centered, compute_uv=False)
+    tolerance = singular_values.max(axis=1, keepdims=True) * 4 * np.finfo(float).eps
+    coplanar[~coplanar] = (singular_values > tolerance).sum(axis=1) <= 2
+    return coplanar
+
+
+def segments_cross(
+    a0: np.ndarray, a1: np.ndarray, b0: np.ndarray, b1: np.ndarray
+) -> np.ndarray:
+    """Whether the segment a0-a1 crosses each of the segments b0-b1.
+
+    Follows LineSegment.intersect_line_segment of skspatial: parallel and
+    skew segments do not cross, the intersection of the lines has to be on
+    both segments. Intersections at an end point of either segment are not
+    counted as crossings.
+    """
+    a0 = np.broadcast_to(np.asarray(a0, dtype=float), b0.shape)
+    a1 = np.broadcast_to(np.asarray(a1, dtype=float), b0.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _segments_cross(a0, a1, b0, b1)
+
+
+def _segments_cross(
+    a0: np.ndarray, a1: np.ndarray, b0: np.ndarray, b1: np.ndarray
+) -> np.ndarray:
+    direction_a = a1 - a0
+    direction_b = b1 - b0
+
+    parallel = (
+        (_dot(direction_a, direction_a) == 0)
+        | (_dot(direction_b, direction_b) == 0)
+        | (np.abs(np.abs(_cosine_similarity(direction_a, direction_b)) - 1) <= REL_TOL)
+    )
+
+    perpendicular = _cross(direction_a, direction_b)
+    num = _dot(_cross(b0 - a0, direction_b), perpendicular)
+    scale = num / np.sqrt(_dot(perpendicular, perpendicular)) ** 2
+    points = a0 + scale[:, None] * direction_a
+
+    end_point = np.zeros(len(points), dtype=bool)
+    for end in [a0, a1, b0, b1]:
+        end_point |= (points == end).all(axis=1)
+    crosses = (
+        ~parallel & _contains(a0, a1, points) & _contains(b0, b1, points) & ~end_point
+    )
+    # Skew lines have an intersection point as well, the rank of the points is
+    # only computed for the few candidates left
+    points = np.stack([a0, a0 + direction_a, b0, b0 + direction_b], axis=1)
+    crosses[crosses] = _are_coplanar(points[crosses])
+    return crosses
+
+
+class SegmentGrid:
+    """Uniform grid of the bounding boxes of segments.
+
+    Every segment is registered in the cells its padded bounding box overlaps,
+    so segments which may cross a new one are found in the cells of the new
+    segment instead of testing all of them.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[tuple, set] = defaultdict(set)
+        self.segments: dict[str, tuple[list[float], list[float]]] = {}
+        self.bounds: dict[str, tuple[list[float], list[float]]] = {}
+
+    def _get_bounds(self, a: list[float], b: list[float]):
+        padding = PADDING * math.dist(a, b)
+        low = [min(a[i], b[i]) - padding for i in range(3)]
+        high = [max(a[i], b[i]) + padding for i in range(3)]
+        return low, high
+
+    def _get_cells(self, low: list[float], high: list[float]):
+        ranges = [
+            range(
+                math.floor(low[i] / self.cell_size),
+                math.floor(high[i] / self.cell_size) + 1,
+            )
+            for i in range(3)
+        ]
+        return itertools.product(*ranges)
+
+    def add(self, key: str, a: list[float], b: list[float]) -> None:
+        self.segments[key] = (a, b)
+        self.bounds[key] = self._get_bounds(a, b)
+        for cell in self._get_cells(*self.bounds[key]):
+            self.cells[cell].add(key)
+
+    def remove(self, key: str) -> None:
+        del self.segments[key]
+        for cell in self._get_cells(*self.bounds.pop(key)):
+            self.cells[cell].discard(key)
+
+    def crosses(self, a: list[float], b: list[float]) -> bool:
+        low, high = self._get_bounds(a, b)
+        candidates = set()
+        for cell in self._get_cells(low, high):
+            candidates.update(self.cells.get(cell, ()))
+        # Segments in the same cells whose padded bounding boxes overlap
+        ends = []
+        for key in candidates:
+            other_low, other_high = self.bounds[key]
+            if all(
+                low[i] <= other_high[i] and other_low[i] <= high[i] for i in range(3)
+            ):
+                ends.append(self.segments[key])
+        if not ends:
+            return False
+        ends = np.array(ends, dtype=float)
+        return bool(segments_cross(a, b, ends[:, 0], ends[:, 1]).any())
+
+    def copy(self) -> "SegmentGrid":
+        grid = SegmentGrid(self.cell_size)
+        grid.cells = defaultdict(
+            set, {cell: set(keys) for cell, keys in self.cells.items()}
+        )
+        grid.segments = dict(self.segments)
+        grid.bounds = dict(self.bounds)
+        return grid
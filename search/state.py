@@ -1,23 +1,71 @@
 import copy
 import random
 import uuid
-from functools import cache
+from collections import Counter
+from concurrent.futures import Future
 
 import numpy as np
-from scipy.spatial import ConvexHull, distance_matrix
-from skspatial.objects import LineSegment
+from scipy.spatial import ConvexHull, cKDTree, minkowski_distance
 
-from fea.pynite import fea_pynite
-from fea.utils import get_all_compression_tension_edges
+from fea.backends import fea_load_cases
+from fea.truss import TrussSolution
+from fea.utils import check_load_cases
 from search.action import AbstractAction, RemoveEdgeAction
 from search.config import UCTSConfig
-from utils.models import Edge, Node, Vector3
+from search.fea_pool import fea_pool
+from search.ground_structure import GroundStructure, get_edge_pair
+from search.rigidity_check import rigidity_check
+from search.score_cache import ScoreCache, get_mask_key, get_topology_key
+from search.segment_grid import SegmentGrid, segments_cross
+from utils.coordinate_index import CoordinateIndex
+from utils.models import Edge, Node, TrussGraph, Vector3
+
+
+def get_utilisations(member_checks: list) -> np.ndarray:
+    # Envelope of the utilisation of every member over all load cases
+    return np.max([member_check.ratios for member_check in member_checks], axis=0)
+
+
+def get_fea_score(edges: list[Edge], case_forces: list[dict]) -> float:
+    member_checks = check_load_cases(edges, case_forces)
+    if any(member_check.failed for member_check in member_checks):
+        return -1
+    ratios = get_utilisations(member_checks)
+    return float(ratios.max() - ratios.min())
 
 
 class State:
-    def __init__(self, config: UCTSConfig, nodes, edges, iteration=0):
-        self.nodes: list[Node] = nodes
-        self.edges = edges
+    def __init__(
+        self,
+        config: UCTSConfig,
+        nodes,
+        edges,
+        iteration=0,
+        score_cache: ScoreCache | None = None,
+    ):
+        # Until the ground structure is set, the state holds lists of nodes and
+        # edges, afterwards it selects them from the ground structure with masks
+        self.ground_structure: GroundStructure | None = None
+        self.node_mask = 0
+        self.edge_mask = 0
+        self._nodes: list[Node] | None = nodes
+        self._edges: list[Edge] | None = edges
+        # Index of the node and edge lists, the ground structure has its own
+        self.node_index = CoordinateIndex()
+        for node in nodes:
+            self.node_index.add(node)
+        self.edge_pairs = Counter()
+        self.node_edges: dict[str, list[Edge]] = {}
+        # Cells of about the spacing of the free joints, but long members should
+        # not be registered in too many cells
+        self.segment_grid = SegmentGrid(
+            max(config.grid_density_unit, config.max_edge_len / 4)
+        )
+        # Running total length of the edge lists, the ground structure sums the
+        # lengths of the edge mask
+        self.length = 0.0
+        for edge in edges:
+            self._index_edge(edge)
         self.iteration = iteration
         self.config = config
         self.grid_nodes = []
@@ -25,6 +73,77 @@ class State:
         # we have to keep the max total edge length to normalize the edge length of a node in the scoring funcction
         self.max_total_edge_length = 0
 
+        # solution of the truss FEA, which is downdated for the children of this state
+        self.fea_solution = None
+        # parent solution and removed edge id to derive fea_solution from
+        self.parent_fea_solution = None
+        self.fea_score = None
+        # fea scores of the topologies of the search, shared by all copies
+        self.score_cache = (
+            ScoreCache(config.score_cache_size) if score_cache is None else score_cache
+        )
+
+    def __getstate__(self):
+        # FEA solutions hold factorizations, which are neither copied nor pickled,
+        # and copies are modified afterwards, so the score is not copied either
+        state = self.__dict__.copy()
+        state["fea_solution"] = None
+        state["parent_fea_solution"] = None
+        state["fea_score"] = None
+        return state
+
+    @property
+    def nodes(self) -> list[Node]:
+        if self._nodes is None:
+            self._nodes = self.ground_structure.get_nodes(self.node_mask)
+        return self._nodes
+
+    @property
+    def edges(self) -> list[Edge]:
+        if self._edges is None:
+            self._edges = self.ground_structure.get_edges(self.edge_mask)
+        return self._edges
+
+    def set_ground_structure(self, ground_structure: GroundStructure) -> None:
+        self.ground_structure = ground_structure
+        self.node_mask = ground_structure.all_nodes
+        self.edge_mask = ground_structure.all_edges
+        self._nodes = None
+        self._edges = None
+        self.node_index = None
+        self.edge_pairs = None
+        self.node_edges = None
+        self.segment_grid = None
+
+    def _index_edge(self, edge: Edge) -> None:
+        self.edge_pairs[get_edge_pair(edge.u, edge.v)] += 1
+        self.node_edges.setdefault(edge.u.id, []).append(edge)
+        self.node_edges.setdefault(edge.v.id, []).append(edge)
+        self.segment_grid.add(edge.id, edge.u.to_array(), edge.v.to_array())
+        self.length += edge.length()
+
+    def _unindex_edge(self, edge: Edge) -> None:
+        pair = get_edge_pair(edge.u, edge.v)
+        self.edge_pairs[pair] -= 1
+        if self.edge_pairs[pair] == 0:
+            del self.edge_pairs[pair]
+        self.node_edges[edge.u.id].remove(edge)
+        self.node_edges[edge.v.id].remove(edge)
+        self.segment_grid.remove(edge.id)
+        self.length -= edge.length()
+
+    def get_node_edges(self, node: Node) -> list[Edge]:
+        if self.ground_structure is None:
+            return self.node_edges.get(node.id, [])
+        mask = self.ground_structure.node_edges[node.index] & self.edge_mask
+        return self.ground_structure.get_edges(mask)
+
+    def degree(self, node: Node) -> int:
+        if self.ground_structure is None:
+            return len(self.node_edges.get(node.id, []))
+        mask = self.ground_structure.node_edges[node.index] & self.edge_mask
+        return mask.bit_count()
+
     def __str__(self):
         return (
             "nodes: "
@@ -40,25 +159,85 @@ class State:
     ):
         return copy.deepcopy(self)
 
+    def copy(self):
+        """Child state which shares the config and the ground structure."""
+        new_state = copy.copy(self)
+        new_state.fea_solution = None
+        new_state.parent_fea_solution = None
+        new_state.fea_score = None
+        if self.ground_structure is None:
+            new_state._nodes = list(self._nodes)
+            new_state._edges = list(self._edges)
+            new_state.node_index = self.node_index.copy()
+            new_state.edge_pairs = self.edge_pairs.copy()
+            new_state.node_edges = {
+                node_id: list(edges) for node_id, edges in self.node_edges.items()
+            }
+            new_state.segment_grid = self.segment_grid.copy()
+        return new_state
+
+    def select(self, node_mask: int, edge_mask: int):
+        """State of the ground structure with the nodes and edges of the masks."""
+        new_state = self.copy()
+        new_state.node_mask = node_mask
+        new_state.edge_mask = edge_mask
+        new_state._nodes = None
+        new_state._edges = None
+        return new_state
+
+    def remove_edge(self, edge: Edge) -> None:
+        """Removes the edge and its nodes if they are left without members,
+        unless they are fixed or loaded."""
+        if self.ground_structure is not None:
+            self.node_mask, self.edge_mask = self.ground_structure.remove_edge(
+                self.node_mask, self.edge_mask, edge
+            )
+            # The lists of the parent may be shared, so they are selected again
+            self._nodes = None
+            self._edges = None
+            return
+
+        for e in [e for e in self._edges if e.id == edge.id]:
+            self._edges.remove(e)
+            self._unindex_edge(e)
+        for edge_node in [edge.u, edge.v]:
+            if edge_node.fixed or edge_node.load:
+                continue
+            if not self.node_edges.get(edge_node.id):
+                self._nodes = [node for node in self._nodes if node.id != edge_node.id]
+                self.node_index.remove(edge_node)
+
+    def get_topology_key(self) -> bytes:
+        if self.ground_structure is None:
+            return get_topology_key(self.config.fea, self.edges)
+        return get_mask_key(
+            self.config.fea, self.ground_structure.token, self.edge_mask
+        )
+
     def add_node(self, node):
         if not self.node_exists(node):
             self.nodes.append(node)
+            if self.ground_structure is None:
+                self.node_index.add(node)
             return True
         return False
 
+    def find_node(self, vec: Vector3) -> Node | None:
+        """Node of the state within the node tolerance of the position."""
+        if self.ground_structure is None:
+            return self.node_index.find(vec)
+        node = self.ground_structure.node_index.find(vec)
+        if node is not None and self.node_mask >> node.index & 1:
+            return node
+        return None
+
     def node_exists(self, node: Node):
-        for n in self.nodes:
-            if (
-                n.vec.x == node.vec.x
-                and n.vec.y == node.vec.y
-                and n.vec.z == node.vec.z
-            ):
-                return True
-        return False
+        return self.find_node(node.vec) is not None
 
     def add_edge(self, edge):
         if not self._edge_exists(edge.u, edge.v) and not self._edge_intersects(edge):
             self.edges.append(edge)
+            self._index_edge(edge)
 
     # def get_legal_actions(self):
     #     node_actions = [AddNodeAction(node) for node in self.grid_nodes]
@@ -66,39 +245,159 @@ class State:
 
     #     return node_actions + edge_actions
     def get_legal_actions(self):
-        return [RemoveEdgeAction(edge) for edge in self.edges]
+        actions = [RemoveEdgeAction(edge) for edge in self.edges]
+        if self.config.order_actions and actions and self.calculate_fea_score() >= 0:
+            # Actions are popped from the end, the members with the lowest
+            # utilisation are removed first
+            order = np.argsort(-self.get_utilisations(), kind="stable")
+            actions = [actions[i] for i in order]
+        return actions
+
+    def get_utilisations(self) -> np.ndarray:
+        """Utilisation of the edges in the envelope of the load cases."""
+        self._derive_fea_solution()
+        if self.fea_solution is None and self.config.fea == "truss":
+            self.fea_solution = TrussSolution(self.nodes, self.edges)
+        if self.fea_solution is not None:
+            case_forces = self.fea_solution.case_forces
+        else:
+            _, case_forces = self.run_fea(self.nodes, self.edges)
+        return get_utilisations(check_load_cases(self.edges, case_forces))
 
     def move(self, action: AbstractAction):
         return action.execute(self)
 
-    @cache
-    def calculate_fea_score(self):
-        if len(self.edges) == 0:
-            return -1
-        force_ratios = []
-
+    def run_fea(
+        self, nodes: list[Node], edges: list[Edge], fea_solution=None, future=None
+    ) -> tuple[TrussSolution | None, list[dict]]:
+        if future is not None:
+            return None, future.result()
+        if self.config.fea != "truss":
+            return None, fea_load_cases(self.config.fea, nodes, edges)
+        if fea_solution is None:
+            fea_solution = TrussSolution(nodes, edges)
+        return fea_solution, fea_solution.case_forces
+
+    def evaluate(
+        self, nodes: list[Node], edges: list[Edge], fea_solution=None, future=None
+    ) -> tuple[TrussSolution | None, list[dict], float]:
+        if len(edges) == 0:
+            return fea_solution, [], -1
+        if (
+            fea_solution is None
+            and future is None
+            and rigidity_check.rejects(self.config.fea, nodes, edges)
+        ):
+            return None, [], -1
         try:
-            max_forces = fea_pynite(self.nodes, self.edges)
-            compression_tension_edges = get_all_compression_tension_edges(
-                self.edges, max_forces
-            )
-            for entry in compression_tension_edges:
-                force_ratios.append(abs(entry["max_force"]) / abs(entry["euler_load"]))
-
-                if abs(entry["max_force"]) > entry["euler_load"]:
-                    # print(
-                    #     f"Member {edge.id}: Max force of {max_force} exceeds the euler load of {euler_load}"
-                    # )
-                    return -1
-
-            max_ratio = max(force_ratios)
-            min_ratio = min(force_ratios)
+            fea_solution, case_forces = self.run_fea(nodes, edges, fea_solution, future)
+            return fea_solution, case_forces, get_fea_score(edges, case_forces)
         except Exception as e:
             print("returning -1 due to exception:")
             print(e)
-            return -1
+            return fea_solution, [], -1
 
-        return max_ratio - min_ratio
+    def _derive_fea_solution(self):
+        if self.fea_solution is None and self.parent_fea_solution is not None:
+            solution, edge_id = self.parent_fea_solution
+            self.fea_solution = solution.remove_edge(edge_id)
+            self.parent_fea_solution = None
+
+    def calculate_fea_score(self):
+        if self.fea_score is None:
+            key = self.get_topology_key()
+            self.fea_score = self.score_cache.get(key)
+            if self.fea_score is None:
+                self._derive_fea_solution()
+                self.fea_solution, _, self.fea_score = self.evaluate(
+                    self.nodes, self.edges, self.fea_solution
+                )
+                self.score_cache.put(key, self.fea_score)
+        return self.fea_score
+
+    def submit_fea(self) -> Future | None:
+        """Starts the FEA of this state in the fea pool and returns its future.
+
+        Known and rejected topologies and searches without the fea pool, which
+        is not started for the truss FEA, get their fea score right away and
+        None is returned.
+        """
+        if self.fea_score is not None or not fea_pool.is_running():
+            self.calculate_fea_score()
+            return None
+        key = self.get_topology_key()
+        self.fea_score = self.score_cache.get(key)
+        if self.fea_score is not None:
+            return None
+        if len(self.edges) == 0 or rigidity_check.rejects(
+            self.config.fea, self.nodes, self.edges
+        ):
+            self.fea_score = -1
+            self.score_cache.put(key, self.fea_score)
+            return None
+        return fea_pool.submit(self.nodes, self.edges)
+
+    def complete_fea(self, future: Future) -> float:
+        _, _, self.fea_score = self.evaluate(self.nodes, self.edges, future=future)
+        self.score_cache.put(self.get_topology_key(), self.fea_score)
+        return self.fea_score
+
+    def batches_removals(self) -> bool:
+        """Whether evaluate_removals is faster than evaluating the children when
+        they are visited, which needs the truss FEA or the fea pool."""
+        return self.config.fea == "truss" or fea_pool.is_running()
+
+    def evaluate_removals(self, actions: list[RemoveEdgeAction]) -> list[float]:
+        """Fea score of the children for each of the removals.
+
+        Scores of known topologies are taken from the score cache. With the truss
+        FEA all other children are downdated from the factorization of this state
+        in one batch, the other backends run them in the fea pool if it is
+        started. The results are stored in the actions, so that executing
+        them later does not run the FEA again.
+        """
+        self.calculate_fea_score()
+        self._derive_fea_solution()
+        if (
+            self.fea_solution is None
+            and self.config.fea == "truss"
+            and self.fea_score >= 0
+        ):
+            # The score was cached, but the children need the factorization
+            self.fea_solution = TrussSolution(self.nodes, self.edges)
+
+        children = [self.copy() for _ in actions]
+        for child, action in zip(children, actions):
+            child.remove_edge(action.edge)
+        keys = [child.get_topology_key() for child in children]
+        for action, key in zip(actions, keys):
+            action.fea_score = self.score_cache.get(key)
+        missing = [i for i, action in enumerate(actions) if action.fea_score is None]
+
+        solutions = [None] * len(missing)
+        if self.fea_solution is not None and missing:
+            solutions = self.fea_solution.remove_edges(
+                [actions[i].edge.id for i in missing]
+            )
+        futures = [None] * len(missing)
+        if fea_pool.is_running():
+            for j, i in enumerate(missing):
+                # Rejected children are not sent to the pool, their future stays None
+                if rigidity_check.rejects(
+                    self.config.fea, children[i].nodes, children[i].edges
+                ):
+                    actions[i].fea_score = -1
+                    self.score_cache.put(keys[i], -1)
+                else:
+                    futures[j] = fea_pool.submit(children[i].nodes, children[i].edges)
+        for i, solution, future in zip(missing, solutions, futures):
+            if actions[i].fea_score is not None:
+                continue
+            actions[i].fea_solution, _, actions[i].fea_score = self.evaluate(
+                children[i].nodes, children[i].edges, solution, future
+            )
+            self.score_cache.put(keys[i], actions[i].fea_score)
+        return [action.fea_score for action in actions]
 
     def should_stop_search(self):
         return (
@@ -119,15 +418,16 @@ class State:
         return Edge(str(uuid.uuid4()), u, v)
 
     def _edge_exists(self, u, v):
-        for edge in self.edges:
-            if (edge.u.id == u.id and edge.v.id == v.id) or (
-                edge.u.id == v.id and edge.v.id == u.id
-            ):
-                return True
-        return False
+        pair = get_edge_pair(u, v)
+        if self.ground_structure is None:
+            return pair in self.edge_pairs
+        index = self.ground_structure.edge_pairs.get(pair)
+        return index is not None and bool(self.edge_mask >> index & 1)
 
     def total_length(self):
-        return sum(edge.length() for edge in self.edges)
+        if self.ground_structure is None:
+            return self.length
+        return self.ground_structure.total_length(self.edge_mask)
 
     def init_fully_connected(self):
         """init the state with free joint nodes that are within in the config constraints"""
@@ -139,6 +439,7 @@ class State:
             self.divide_too_long_edge(edge, edges_to_remove, edges_to_add)
         for edge in edges_to_remove:
             self.edges.remove(edge)
+            self._unindex_edge(edge)
         for edge in edges_to_add:
             self.add_edge(edge)
 
@@ -154,114 +455,113 @@ class State:
 
         self.connect_nodes_nearest_neighbors(num_neighbors=5)
 
-        self.max_total_edge_length = self.total_length()
-
-    def is_point_in_hull(self, point, hull):
-        new_hull = ConvexHull(np.vstack((hull.points, point)))
-        return np.array_equal(new_hull.vertices, hull.vertices)
-
-    def distance_to_edge(self, point, edge_start, edge_end):
-        edge = edge_end - edge_start
-        point_vector = point - edge_start
-        edge_length = np.linalg.norm(edge)
-
-        if edge_length == 0:
-            return np.linalg.norm(point_vector)
+        # The ground structure does not change during the search, all states share it
+        self.set_ground_structure(
+            GroundStructure(TrussGraph.from_objects(self.nodes, self.edges))
+        )
 
-        projection_length = np.dot(point_vector, edge) / edge_length
-        projection_length_clamped = np.clip(projection_length, 0, edge_length)
+        self.max_total_edge_length = self.total_length()
 
-        closest_point_on_edge = edge_start + (
-            edge * (projection_length_clamped / edge_length)
+    def points_in_hull(self, points, hull, tolerance=1e-12):
+        # Points on the facets do not change the vertices of the hull, they are inside
+        offsets = points @ hull.equations[:, :3].T + hull.equations[:, 3]
+        return (offsets <= tolerance * np.abs(hull.points).max()).all(axis=1)
+
+    def distances_to_edges(self, points, edge_starts, edge_ends, chunk_size=65536):
+        """Distances of every point (rows) to every edge (columns).
+
+        The points are processed in chunks of about chunk_size point-edge pairs,
+        so that the intermediates do not grow with the number of grid points.
+        """
+        edges = edge_ends - edge_starts
+        edge_lengths = np.linalg.norm(edges, axis=1)
+        # A zero-length edge has no direction, its closest point is its start
+        directions = np.divide(
+            edges,
+            edge_lengths[:, None],
+            out=np.zeros_like(edges, dtype=float),
+            where=edge_lengths[:, None] > 0,
         )
-        return np.linalg.norm(point - closest_point_on_edge)
+        distances = np.empty((len(points), len(edges)))
+        step = max(1, chunk_size // max(len(edges), 1))
+        for start in range(0, len(points), step):
+            point_vectors = points[start : start + step, None] - edge_starts
+            projection_lengths = np.clip(
+                np.einsum("pei,ei->pe", point_vectors, directions), 0, edge_lengths
+            )
+            distances[start : start + step] = np.linalg.norm(
+                point_vectors - directions * projection_lengths[:, :, None], axis=2
+            )
+        return distances
 
-    def distance_to_vertex(self, point, vertex):
-        return np.linalg.norm(point - vertex)
+    def distances_to_vertices(self, points, vertices):
+        return np.linalg.norm(points[:, None] - vertices, axis=2)
 
     def get_nodes_in_convex_hull(
         self, grid_spacing=0.5, clamp_tolerance=0.1, vertex_tolerance=0.1
     ):
-        points = [np.array([node.vec.x, node.vec.y, node.vec.z]) for node in self.nodes]
+        points = np.array([[node.vec.x, node.vec.y, node.vec.z] for node in self.nodes])
 
         hull = ConvexHull(points)
-        nodes_within_hull = []
-        nodes_on_edges = set()
-        grid_range_x = [
-            min([point[0] for point in points]),
-            max([point[0] for point in points]),
-        ]
-        grid_range_y = [
-            min([point[1] for point in points]),
-            max([point[1] for point in points]),
-        ]
-        grid_range_z = [
-            min([point[2] for point in points]),
-            max([point[2] for point in points]),
+        ranges = [
+            np.arange(
+                points[:, i].min(), points[:, i].max() + grid_spacing, grid_spacing
+            )
+            for i in range(3)
         ]
-
-        x_range = np.arange(
-            grid_range_x[0], grid_range_x[1] + grid_spacing, grid_spacing
-        )
-        y_range = np.arange(
-            grid_range_y[0], grid_range_y[1] + grid_spacing, grid_spacing
-        )
-        z_range = np.arange(
-            grid_range_z[0], grid_range_z[1] + grid_spacing, grid_spacing
-        )
+        # Grid points in the order of nested x, y and z loops
+        grid = np.stack(np.meshgrid(*ranges, indexing="ij"), axis=-1).reshape(-1, 3)
+        grid = grid[self.points_in_hull(grid, hull)]
 
         # Define edges from hull simplices
-        edges = set()
-        for simplex in hull.simplices:
-            for i in range(len(simplex)):
-                edge = tuple(sorted([simplex[i], simplex[(i + 1) % len(simplex)]]))
-                edges.add(edge)
-        edges = list(edges)
-
-        for x in x_range:
-            for y in y_range:
-                for z in z_range:
-                    point = np.array([x, y, z])
-                    if self.is_point_in_hull(point, hull):
-                        # Check if the point is near any edge
-                        for edge_indices in edges:
-                            edge_start, edge_end = (
-                                points[edge_indices[0]],
-                                points[edge_indices[1]],
-                            )
-                            if (
-                                self.distance_to_edge(point, edge_start, edge_end)
-                                <= clamp_tolerance
-                            ):
-                                if all(
-                                    self.distance_to_vertex(point, vertex)
-                                    > vertex_tolerance
-                                    for vertex in points
-                                ):
-                                    nodes_on_edges.add(tuple(point))
-                                break
-                        else:
-                            nodes_within_hull.append(point)
-
+        edges = np.unique(
+            np.sort(
+                np.concatenate([hull.simplices[:, [i, (i + 1) % 3]] for i in range(3)]),
+                axis=1,
+            ),
+            axis=0,
+        )
+        near_edge = (
+            self.distances_to_edges(grid, points[edges[:, 0]], points[edges[:, 1]])
+            <= clamp_tolerance
+        ).any(axis=1)
+        # Points near an edge are clamped to it, unless they are close to a vertex
+        away_from_vertices = (
+            self.distances_to_vertices(grid[near_edge], points) > vertex_tolerance
+        ).all(axis=1)
+
+        nodes_within_hull = list(grid[~near_edge])
+        nodes_on_edges = set()
+        for point in grid[near_edge][away_from_vertices]:
+            nodes_on_edges.add(tuple(point))
         return nodes_within_hull + list(nodes_on_edges)
 
     def connect_nodes_nearest_neighbors(self, num_neighbors=1):
-        # Compute distance matrix
         nodes = np.array([[node.vec.x, node.vec.y, node.vec.z] for node in self.nodes])
-        dist_matrix = distance_matrix(nodes, nodes)
-        np.fill_diagonal(dist_matrix, np.inf)  # Avoid zero distance to self
-
-        for i in range(len(nodes)):
-            # Find the indices of the nearest neighbors
-            nearest_neighbors = np.argsort(dist_matrix[i])[:num_neighbors]
-            for neighbor in nearest_neighbors:
-                if (
-                    not self._edge_exists(self.nodes[i], self.nodes[neighbor])
-                    and i != neighbor
-                ):
-                    self.add_edge(
-                        Edge(str(uuid.uuid4()), self.nodes[i], self.nodes[neighbor])
-                    )
+        max_distance = self.config.max_neighbor_distance
+        if max_distance is None:
+            max_distance = np.inf
+        tree = cKDTree(nodes)
+        # Distance of the furthest neighbor, the first neighbor of a node is itself
+        distances, _ = tree.query(nodes, k=min(num_neighbors + 1, len(nodes)))
+        radii = np.minimum(distances.reshape(len(nodes), -1)[:, -1], max_distance)
+        # All nodes at that distance, ties are resolved by the node order
+        candidates = tree.query_ball_point(nodes, radii * (1 + 1e-9))
+
+        pairs = {}
+        for i, neighbors in enumerate(candidates):
+            neighbors = np.array([j for j in neighbors if j != i], dtype=int)
+            distances = minkowski_distance(nodes[neighbors], nodes[i])
+            order = np.lexsort((neighbors, distances))[:num_neighbors]
+            for j in neighbors[order][distances[order] <= max_distance]:
+                # The first direction of a pair is kept
+                pair = get_edge_pair(self.nodes[i], self.nodes[j])
+                pairs.setdefault(pair, (i, j))
+
+        # Pairs which cross the edges added before them also cross the later ones
+        for pair, (i, j) in pairs.items():
+            if pair not in self.edge_pairs:
+                self.add_edge(Edge(str(uuid.uuid4()), self.nodes[i], self.nodes[j]))
 
     def _get_free_edges(self):
         free_edges = []
@@ -285,38 +585,35 @@ class State:
                 (edge.u.vec.y + edge.v.vec.y) / 2,
                 (edge.u.vec.z + edge.v.vec.z) / 2,
             )
-            new_node = Node(str(uuid.uuid4()), middle)
-            if self.add_node(new_node):
-                self.divide_too_long_edge(
-                    Edge(str(uuid.uuid4()), edge.u, new_node),
-                    edges_to_remove,
-                    edges_to_add,
-                )
-                self.divide_too_long_edge(
-                    Edge(str(uuid.uuid4()), new_node, edge.v),
-                    edges_to_remove,
-                    edges_to_add,
-                )
+            # A node at the middle may exist already, e.g. from a crossing edge
+            new_node = self.find_node(middle)
+            if new_node is None:
+                new_node = Node(str(uuid.uuid4()), middle)
+                self.add_node(new_node)
+            self.divide_too_long_edge(
+                Edge(str(uuid.uuid4()), edge.u, new_node),
+                edges_to_remove,
+                edges_to_add,
+            )
+            self.divide_too_long_edge(
+                Edge(str(uuid.uuid4()), new_node, edge.v),
+                edges_to_remove,
+                edges_to_add,
+            )
 
         else:
             edges_to_add.append(edge)
 
     def _edge_intersects(self, edge: Edge):
-        line_a = LineSegment(edge.u.to_array(), edge.v.to_array())
-        for existing_edge in self.edges:
-            line_b = LineSegment(existing_edge.u.to_array(), existing_edge.v.to_array())
-            try:
-                intersection = line_a.intersect_line_segment(line_b)
-                if (
-                    intersection.is_equal(line_a.point_a)
-                    or intersection.is_equal(line_a.point_b)
-                    or intersection.is_equal(line_b.point_a)
-                    or intersection.is_equal(line_b.point_b)
-                ):
-                    continue
-                if intersection is not None:
-                    return True
-
-            except Exception:
-                continue
-        return False
+        if self.segment_grid is not None:
+            return self.segment_grid.crosses(edge.u.to_array(), edge.v.to_array())
+        if not self.edges:
+            return False
+        ends = np.array(
+            [[e.u.to_array(), e.v.to_array()] for e in self.edges], dtype=float
+        )
+        return bool(
+            segments_cross(
+                edge.u.to_array(), edge.v.to_array(), ends[:, 0], ends[:, 1]
+            ).any()
+        )
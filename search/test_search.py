@@ -0,0 +1,526 @@
+import contextlib
+import copy
+import io
+import itertools
+import json
+import tempfile
+import unittest
+
+import numpy as np
+from scipy.spatial import ConvexHull
+
+from fea.generators import GENERATORS, get_support
+from fea.rigidity import find_mechanism
+from fea.truss import TrussSolution
+from search.best_designs import BestDesigns
+from search.checkpoint import Checkpoint
+from search.config import UCTSConfig
+from search.fea_pool import fea_pool
+from search.ground_structure import GroundStructure
+from search.parallel import simulate_root_parallel
+from search.score_cache import ScoreCache
+from search.segment_grid import SegmentGrid
+from search.state import State
+from search.tree_statistics import TreeStatistics
+from search.truss_search_tree import TreeSearchNode, TrussSearchTree
+from utils.config import load_config
+from utils.coordinate_index import CoordinateIndex
+from utils.models import Edge, Node, TrussGraph, Vector3
+from utils.parser import read_json
+
+
+def get_search_tree(name: str, size: int, **options) -> TrussSearchTree:
+    """Search tree of a generated truss with the truss FEA and the given options
+    of the ucts config."""
+    config = UCTSConfig("search/config/tower.yaml")
+    config.fea = "truss"
+    for option, value in options.items():
+        setattr(config, option, value)
+    nodes, edges = GENERATORS[name](size)
+    state = State(config, nodes, edges)
+    state.set_ground_structure(GroundStructure(TrussGraph.from_objects(nodes, edges)))
+    state.max_total_edge_length = state.total_length()
+    return TrussSearchTree(TreeSearchNode(state))
+
+
+def get_ground_structure(config_file: str) -> State:
+    """Fully connected ground structure of the input of a config with the truss FEA."""
+    config = UCTSConfig(config_file)
+    config.fea = "truss"
+    nodes, edges = read_json(load_config(config_file)["general"]["input_file"])
+    state = State(config, nodes, edges)
+    state.init_fully_connected()
+    return state
+
+
+class TestSearch(unittest.TestCase):
+    def test_segments_cross(self):
+        segment = [[0, 0, 0], [2, 0, 0]]
+        others = {
+            "crossing": ([[1, -1, 0], [1, 1, 0]], True),
+            "end point": ([[2, 0, 0], [2, 1, 0]], False),
+            "touching": ([[1, 0, 0], [1, 1, 0]], False),
+            "skew": ([[1, -1, 1], [1, 1, 0.5]], False),
+            "collinear": ([[1, 0, 0], [3, 0, 0]], False),
+            "apart": ([[3, -1, 0], [3, 1, 0]], False),
+        }
+        for name, (other, crosses) in others.items():
+            with self.subTest(name):
+                grid = SegmentGrid(0.5)
+                grid.add("other", *other)
+                self.assertEqual(grid.crosses(*segment), crosses)
+
+    def test_coordinate_index(self):
+        index = CoordinateIndex(1e-6)
+        node = Node("node", Vector3(1, 2, 3))
+        index.add(node)
+        positions = {
+            "same": (Vector3(1, 2, 3), node),
+            "within tolerance": (Vector3(1 + 5e-7, 2 - 5e-7, 3), node),
+            "outside tolerance": (Vector3(1 + 2e-6, 2, 3), None),
+        }
+        for name, (vec, found) in positions.items():
+            with self.subTest(name):
+                self.assertIs(index.find(vec), found)
+
+    def test_state_remove_edge(self):
+        config = UCTSConfig("search/config/tower.yaml")
+        support = Node("support", Vector3(0, 0, 0), **get_support())
+        joint = Node("joint", Vector3(1, 0, 0))
+        loaded_node = Node("loaded", Vector3(1, 1, 0), load=Vector3(0, -1, 0))
+        nodes = [support, joint, loaded_node]
+        edges = [
+            Edge("edge_0", support, joint),
+            Edge("edge_1", joint, loaded_node),
+            Edge("edge_2", support, loaded_node),
+        ]
+        # The state changes the lists it is given
+        state = State(config, list(nodes), list(edges))
+        state.remove_edge(edges[0])
+        self.assertIs(state.find_node(joint.vec), joint)
+        state.remove_edge(edges[1])
+        with self.subTest("orphaned node"):
+            self.assertNotIn(joint, state.nodes)
+            self.assertIsNone(state.find_node(joint.vec))
+            self.assertTrue(state.add_node(joint))
+        with self.subTest("loaded node"):
+            self.assertIs(state.find_node(loaded_node.vec), loaded_node)
+
+    def test_tree_statistics(self):
+        statistics = TreeStatistics(capacity=2)
+        indices = [statistics.add() for _ in range(2)]
+        statistics.update(indices, 1.0, 0.5)
+        # The arrays grow past their capacity and keep the statistics
+        indices += [statistics.add() for _ in range(3)]
+        with self.subTest("growth"):
+            self.assertEqual(indices, list(range(5)))
+            self.assertGreaterEqual(len(statistics.visits), 5)
+            np.testing.assert_array_equal(statistics.visits[:5], [1, 1, 0, 0, 0])
+            np.testing.assert_array_equal(statistics.results[:5], [0.5, 0.5, 0, 0, 0])
+        statistics.update([0, 1], -1.0, -0.5)
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            path = [0] + sorted(rng.choice(range(1, 5), 2, replace=False).tolist())
+            statistics.update(path, 1.0, rng.uniform(-1, 1))
+        with self.subTest("visits"):
+            self.assertEqual(statistics.visits[0], 50)
+            self.assertEqual(statistics.visits[1:5].sum(), 100)
+        with self.subTest("ucb"):
+            for c_param in [0.3, 1]:
+                ucb = statistics.ucb(0, np.arange(1, 5), c_param)
+                expected = [
+                    (statistics.results[c] / statistics.visits[c])
+                    + c_param
+                    * np.sqrt((2 * np.log(statistics.visits[0]) / statistics.visits[c]))
+                    for c in range(1, 5)
+                ]
+                np.testing.assert_allclose(ucb, expected)
+
+    def test_progressive_widening(self):
+        for constant, exponent in [(0, 0.5), (1, 0.5), (2, 0.5), (1, 1)]:
+            with self.subTest(widening_constant=constant, widening_exponent=exponent):
+                tree = get_search_tree(
+                    "tower",
+                    2,
+                    widening_constant=constant,
+                    widening_exponent=exponent,
+                )
+                root = tree.root
+                num_actions = len(root.untried_actions)
+                for visits in [0, 1, 4, 9]:
+                    tree.statistics.visits[root.index] = visits
+                    if constant > 0:
+                        limit = min(max(1, constant * visits**exponent), num_actions)
+                    else:
+                        limit = num_actions
+                    while len(root.children) < limit:
+                        self.assertFalse(root.is_fully_expanded())
+                        root.expand()
+                    self.assertTrue(root.is_fully_expanded())
+
+    def test_ordered_actions(self):
+        tree = get_search_tree("bridge", 2, order_actions=True)
+        state = tree.root.state
+        utilisations = state.get_utilisations()
+        edge_utilisations = {
+            edge.index: utilisation
+            for edge, utilisation in zip(state.edges, utilisations)
+        }
+        actions = state.get_legal_actions()
+        ordered = [edge_utilisations[action.edge.index] for action in actions]
+        # The last action is popped first
+        self.assertEqual(ordered[-1], utilisations.min())
+        self.assertEqual(ordered, sorted(ordered, reverse=True))
+        self.assertEqual(
+            tree.root.untried_actions.pop().edge.index, actions[-1].edge.index
+        )
+
+    def test_checkpoint(self):
+        np.random.seed(0)
+        tree = get_search_tree("tower", 3, widening_constant=1)
+        with tempfile.TemporaryDirectory() as dirname:
+            checkpoint = Checkpoint(dirname)
+            checkpoint.create(tree)
+            tree.simulate(20, show_progress=False)
+            checkpoint.save(tree, 20)
+            tree.simulate(10, show_progress=False)
+            checkpoint.save(tree, 30)
+            loaded_tree, iterations = Checkpoint(dirname).load(tree.root.state.config)
+        self.assertEqual(iterations, 30)
+        size = tree.statistics.size
+        self.assertEqual(loaded_tree.statistics.size, size)
+        for name in ["visits", "results"]:
+            with self.subTest(name):
+                np.testing.assert_array_equal(
+                    getattr(loaded_tree.statistics, name)[:size],
+                    getattr(tree.statistics, name)[:size],
+                )
+        loaded_nodes = {node.index: node for node in loaded_tree.get_nodes()}
+        self.assertEqual(len(loaded_nodes), len(tree.get_nodes()))
+        for node in tree.get_nodes():
+            with self.subTest(node.index):
+                loaded_node = loaded_nodes[node.index]
+                self.assertEqual(loaded_node.state.node_mask, node.state.node_mask)
+                self.assertEqual(loaded_node.state.edge_mask, node.state.edge_mask)
+                self.assertEqual(loaded_node.score, node.score)
+                self.assertEqual(
+                    [child.index for child in loaded_node.children],
+                    [child.index for child in node.children],
+                )
+                self.assertEqual(
+                    [action.edge.index for action in loaded_node.untried_actions],
+                    [action.edge.index for action in node.untried_actions],
+                )
+
+    def test_best_designs(self):
+        tree = get_search_tree("tower", 2)
+        nodes = [tree.root.expand() for _ in range(3)]
+        for score, node in zip([0.1, 0.3, 0.2], nodes):
+            node.score = score
+        with tempfile.TemporaryDirectory() as dirname:
+            filename = f"{dirname}/best_designs.jsonl"
+            best_designs = BestDesigns(2, filename)
+            for iteration, node in enumerate(nodes):
+                best_designs.update(node, iteration)
+            # Later rollouts change the score of a node in the heap
+            nodes[1].score = -1
+            with open(filename) as f:
+                written = [json.loads(line)["score"] for line in f]
+        with self.subTest("get"):
+            self.assertEqual(
+                [(score, node.index) for score, node in best_designs.get()],
+                [(0.2, nodes[2].index), (0.3, nodes[1].index)],
+            )
+        with self.subTest("file"):
+            self.assertEqual(written, [0.1, 0.3, 0.2])
+
+    def test_tower_ground_structure(self):
+        # The unloaded collinear joints of the tower are mechanisms, but the
+        # load does not excite them
+        state = get_ground_structure("search/config/tower.yaml")
+        self.assertIsNone(find_mechanism(state.nodes, state.edges))
+        solution = TrussSolution(state.nodes, state.edges)
+        self.assertTrue(solution.is_stable)
+        with self.subTest("equilibrium"):
+            graph = TrussGraph.from_nodes(state.nodes, state.edges)
+            connectivity = graph.connectivity.astype(np.int64)
+            vectors = (
+                graph.coordinates[connectivity[:, 1]]
+                - graph.coordinates[connectivity[:, 0]]
+            )
+            directions = vectors / np.linalg.norm(vectors, axis=1)[:, None]
+            forces = np.array(
+                [solution.max_forces[edge_id] for edge_id in graph.edge_ids]
+            )
+            # Compression pushes the nodes of a member apart
+            residual = graph.get_loads().copy()
+            np.add.at(residual, connectivity[:, 0], -forces[:, None] * directions)
+            np.add.at(residual, connectivity[:, 1], forces[:, None] * directions)
+            free = ~(graph.supported[:, None] & graph.t_supports)
+            self.assertLess(np.abs(residual[free]).max(), 1e-9)
+        with self.subTest("search"):
+            self.assertGreaterEqual(state.calculate_fea_score(), 0)
+            tree = TrussSearchTree(TreeSearchNode(state))
+            tree.simulate(20, show_progress=False)
+            self.assertGreater(len(state.score_cache), 1)
+            self.assertGreater(tree.root.q, -tree.root.n)
+
+    def test_evaluate_removals(self):
+        state = get_ground_structure("search/config/tower.yaml")
+        actions = state.get_legal_actions()
+        scores = state.evaluate_removals(actions)
+        self.assertGreater(
+            sum(action.fea_solution is not None for action in actions), 0
+        )
+        for action, score in zip(actions, scores):
+            with self.subTest(action.edge.id):
+                child = state.copy()
+                child.remove_edge(action.edge)
+                # The child is solved from scratch with its own score cache
+                child = State(state.config, child.nodes, child.edges)
+                self.assertAlmostEqual(child.calculate_fea_score(), score)
+
+    def test_root_parallel(self):
+        state = get_search_tree("tower", 2).root.state
+        config = state.config
+        config.num_trees = 2
+        config.seed = 0
+        for max_iter, sync_interval in [(5, 0), (7, 2)]:
+            with self.subTest(max_iter=max_iter, sync_interval=sync_interval):
+                config.max_iter = max_iter
+                config.sync_interval = sync_interval
+                with contextlib.redirect_stdout(io.StringIO()):
+                    statistics, designs = simulate_root_parallel(state, config, 3)
+                self.assertLessEqual(len(designs), 3)
+                if sync_interval == 0:
+                    # Every rollout of a tree visits one child of its root
+                    self.assertEqual(sum(n for n, _ in statistics.values()), max_iter)
+        with self.subTest("seed"):
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = [simulate_root_parallel(state, config, 3) for _ in range(2)]
+            self.assertEqual(results[0], results[1])
+        with self.subTest("failing tree"):
+            # The trees fail in their first expansion
+            config.widening_constant = 1
+            config.widening_exponent = "0.5"
+            with self.assertRaises(TypeError):
+                simulate_root_parallel(state, config, 3)
+
+    def test_score_cache(self):
+        cache = ScoreCache(max_size=2)
+        cache.put(b"a", 0.1)
+        cache.put(b"b", 0.2)
+        self.assertEqual(cache.get(b"a"), 0.1)
+        # b is the least recently used score
+        cache.put(b"c", 0.3)
+        with self.subTest("eviction"):
+            self.assertEqual(len(cache), 2)
+            self.assertIsNone(cache.get(b"b"))
+            self.assertEqual(cache.get(b"a"), 0.1)
+            self.assertEqual(cache.get(b"c"), 0.3)
+        with self.subTest("counters"):
+            self.assertEqual((cache.hits, cache.misses), (3, 1))
+        with self.subTest("disabled"):
+            cache = ScoreCache(max_size=0)
+            cache.put(b"a", 0.1)
+            self.assertEqual(len(cache), 0)
+            self.assertIsNone(cache.get(b"a"))
+        with self.subTest("shared by copies"):
+            state = get_search_tree("tower", 2).root.state
+            state.calculate_fea_score()
+            self.assertIs(state.copy().score_cache, state.score_cache)
+            self.assertIs(copy.deepcopy(state).score_cache, state.score_cache)
+            self.assertEqual(len(state.score_cache), 1)
+
+    def test_nodes_in_convex_hull(self):
+        # Reference of the previous implementation, which tested every grid
+        # point with a new hull and every edge and vertex one at a time
+        def get_reference(points, grid_spacing, clamp_tolerance, vertex_tolerance):
+            hull = ConvexHull(points)
+            edges = {
+                tuple(sorted([simplex[i], simplex[(i + 1) % 3]]))
+                for simplex in hull.simplices
+                for i in range(3)
+            }
+            ranges = [
+                np.arange(
+                    points[:, i].min(), points[:, i].max() + grid_spacing, grid_spacing
+                )
+                for i in range(3)
+            ]
+            nodes_within_hull = []
+            nodes_on_edges = set()
+            for point in itertools.product(*ranges):
+                point = np.array(point)
+                new_hull = ConvexHull(np.vstack((hull.points, point)))
+                if not np.array_equal(new_hull.vertices, hull.vertices):
+                    continue
+                for i, j in edges:
+                    edge = points[j] - points[i]
+                    projection = np.clip(
+                        np.dot(point - points[i], edge) / np.linalg.norm(edge),
+                        0,
+                        np.linalg.norm(edge),
+                    )
+                    closest = points[i] + edge * projection / np.linalg.norm(edge)
+                    if np.linalg.norm(point - closest) <= clamp_tolerance:
+                        if all(
+                            np.linalg.norm(point - vertex) > vertex_tolerance
+                            for vertex in points
+                        ):
+                            nodes_on_edges.add(tuple(point))
+                        break
+                else:
+                    nodes_within_hull.append(tuple(point))
+            return nodes_within_hull + list(nodes_on_edges)
+
+        config = UCTSConfig("search/config/tower.yaml")
+        for input_file in ["search/input/tower.json", "search/input/bridge.json"]:
+            for grid_spacing, clamp_tolerance in [(1, 1), (0.5, 0.1)]:
+                with self.subTest(
+                    input_file, grid_spacing=grid_spacing, clamp=clamp_tolerance
+                ):
+                    nodes, edges = read_json(input_file)
+                    state = State(config, nodes, edges)
+                    points = np.array([node.to_array() for node in nodes])
+                    self.assertEqual(
+                        sorted(
+                            tuple(point)
+                            for point in state.get_nodes_in_convex_hull(
+                                grid_spacing, clamp_tolerance
+                            )
+                        ),
+                        sorted(
+                            get_reference(points, grid_spacing, clamp_tolerance, 0.1)
+                        ),
+                    )
+
+    def test_max_neighbor_distance(self):
+        config = UCTSConfig("search/config/tower.yaml")
+        positions = [0, 1, 3, 6]
+        expected_pairs = {
+            "no limit": (None, {(0, 1), (1, 2), (2, 3)}),
+            "zero": (0, set()),
+            "limit": (2.5, {(0, 1), (1, 2)}),
+        }
+        for name, (max_neighbor_distance, pairs) in expected_pairs.items():
+            with self.subTest(name):
+                config.max_neighbor_distance = max_neighbor_distance
+                nodes = [
+                    Node(f"{i}", Vector3(x, 0, 0)) for i, x in enumerate(positions)
+                ]
+                state = State(config, nodes, [])
+                state.connect_nodes_nearest_neighbors(num_neighbors=1)
+                self.assertEqual(
+                    {tuple(sorted((int(e.u.id), int(e.v.id)))) for e in state.edges},
+                    pairs,
+                )
+
+    def test_transpositions(self):
+        tree = get_search_tree("tower", 2)
+        root = tree.root
+        edge_ids = [action.edge.id for action in root.untried_actions[-2:]]
+        children = [root.expand(tree.transpositions) for _ in edge_ids]
+        grandchildren = []
+        # Removing the edges in either order reaches the same topology
+        for child, edge_id in zip(children, edge_ids):
+            actions = child.untried_actions
+            action = next(a for a in actions if a.edge.id == edge_id)
+            actions.remove(action)
+            actions.append(action)
+            grandchildren.append(child.expand(tree.transpositions))
+        self.assertIs(grandchildren[0], grandchildren[1])
+        self.assertEqual(len(tree.get_nodes()), 4)
+        tree.statistics.update(
+            [root.index, children[0].index, grandchildren[0].index], 1.0, 0.5
+        )
+        tree.statistics.update(
+            [root.index, children[1].index, grandchildren[1].index], 1.0, 0.5
+        )
+        self.assertEqual(grandchildren[0].n, 2)
+        self.assertEqual(grandchildren[1].q, 1.0)
+
+    def test_state_copy(self):
+        parent = get_search_tree("tower", 2).root.state
+        node_mask, edge_mask = parent.node_mask, parent.edge_mask
+        edges = parent.edges
+        child = parent.copy()
+        self.assertIs(child.ground_structure, parent.ground_structure)
+        self.assertIs(child.score_cache, parent.score_cache)
+        child.remove_edge(edges[0])
+        # The child only changes its own masks, the parent keeps its edges
+        self.assertEqual(child.edge_mask, edge_mask & ~(1 << edges[0].index))
+        self.assertEqual((parent.node_mask, parent.edge_mask), (node_mask, edge_mask))
+        self.assertEqual(parent.edges, edges)
+        self.assertNotIn(edges[0], child.edges)
+        self.assertEqual(len(child.edges), len(edges) - 1)
+
+    def test_adjacency_index(self):
+        config = UCTSConfig("search/config/tower.yaml")
+        nodes = [
+            Node("support", Vector3(0, 0, 0), **get_support()),
+            Node("joint", Vector3(1, 0, 0)),
+            Node("loaded", Vector3(1, 1, 0), load=Vector3(0, -1, 0)),
+        ]
+        state = State(config, list(nodes), [])
+        edges = [
+            Edge("edge_0", nodes[0], nodes[1]),
+            Edge("edge_1", nodes[1], nodes[2]),
+            Edge("edge_2", nodes[0], nodes[2]),
+        ]
+        for edge in edges:
+            state.add_edge(edge)
+        # Reversed duplicates are not added
+        state.add_edge(Edge("duplicate", nodes[1], nodes[0]))
+        with self.subTest("add"):
+            self.assertEqual(len(state.edge_pairs), 3)
+            self.assertTrue(state._edge_exists(nodes[1], nodes[0]))
+            self.assertEqual([state.degree(node) for node in nodes], [2, 2, 2])
+            self.assertAlmostEqual(state.total_length(), 2 + np.sqrt(2))
+        state.remove_edge(edges[0])
+        with self.subTest("remove"):
+            self.assertFalse(state._edge_exists(nodes[0], nodes[1]))
+            self.assertEqual(state.get_node_edges(nodes[0]), [edges[2]])
+            self.assertEqual([state.degree(node) for node in nodes], [1, 1, 2])
+            self.assertAlmostEqual(state.total_length(), 1 + np.sqrt(2))
+        with self.subTest("ground structure"):
+            state = get_search_tree("tower", 2).root.state
+            for edge in state.edges[:3]:
+                state.remove_edge(edge)
+            self.assertAlmostEqual(
+                state.total_length(), sum(edge.length() for edge in state.edges)
+            )
+            for node in state.nodes:
+                self.assertEqual(state.degree(node), len(state.get_node_edges(node)))
+
+    def test_simulate_parallel(self):
+        tree = get_search_tree("tower", 2, fea="simple")
+        state = tree.root.state
+        fea_pool.start("simple", state.nodes, state.edges, 2)
+        self.assertTrue(fea_pool.is_running())
+        try:
+            done = tree.simulate_parallel(12, 4, virtual_loss=5.0, show_progress=False)
+        finally:
+            fea_pool.shutdown()
+        self.assertEqual(done, 12)
+        self.assertEqual(tree.iterations, 12)
+        self.assertEqual(tree.root.n, 12)
+        # The virtual losses of the pending rollouts are removed again
+        for node in tree.get_nodes():
+            self.assertLessEqual(abs(node.q), node.n)
+        self.assertLessEqual(sum(child.n for child in tree.root.children), 12)
+
+    def test_rollout_in_place(self):
+        tree = get_search_tree("tower", 2)
+        node = tree.root.expand(tree.transpositions)
+        masks = (node.state.node_mask, node.state.edge_mask)
+        edges = list(node.state.edges)
+        rollout_masks = []
+        for state in node.rollout_states():
+            state.calculate_fea_score()
+            rollout_masks.append(state.edge_mask)
+        # The rollout steps change one copy of the state, never the state of the node
+        self.assertGreater(len(set(rollout_masks) - {masks[1]}), 1)
+        self.assertEqual((node.state.node_mask, node.state.edge_mask), masks)
+        self.assertEqual(node.state.edges, edges)
+        self.assertIsNotNone(node.score)
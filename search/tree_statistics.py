@@ -0,0 +1,31 @@
+import numpy as np
+
+
+class TreeStatistics:
+    """Visit counts and rewards of all nodes of a search tree in growable arrays.
+
+    Nodes are numbered in the order they are added. The arrays double their
+    capacity when they are full, so adding a node is amortized constant time.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.size = 0
+        self.visits = np.zeros(capacity)
+        self.results = np.zeros(capacity)
+
+    def add(self) -> int:
+        if self.size == len(self.visits):
+            self.visits = np.concatenate([self.visits, np.zeros(len(self.visits))])
+            self.results = np.concatenate([self.results, np.zeros(len(self.results))])
+        self.size += 1
+        return self.size - 1
+
+    def update(self, indices, visits: float, result: float) -> None:
+        # The nodes of a path are distinct, so fancy indexing adds once per node
+        self.visits[indices] += visits
+        self.results[indices] += result
+
+    def ucb(self, parent: int, children: np.ndarray, c_param: float) -> np.ndarray:
+        visits = self.visits[children]
+        exploration = np.sqrt(2 * np.log(self.visits[parent]) / visits)
+        return self.results[children] / visits + c_param * exploration
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
 import numpy as np
 from tqdm import tqdm
 
+from search.action import RemoveEdgeAction
 from search.state import State
+from search.tree_statistics import TreeStatistics
 
 
 class TreeSearchNode:
@@ -14,11 +19,16 @@ class TreeSearchNode:
     ):
         self.state = state
         self.parent = parent
-        self._number_of_visits = 0.0
-        self._result = 0.0
+        # visits and rewards are stored in the arrays of the tree, at self.index
+        self.statistics = TreeStatistics() if parent is None else parent.statistics
+        self.index = self.statistics.add()
         self._untried_actions = None
         self.children = []
+        # indices of the children, built once the node is fully expanded
+        self._child_indices = None
         self.score = -100
+        # whether all children were evaluated in one batch on the first expansion
+        self.children_evaluated = False
 
     @property
     def untried_actions(self):
@@ -28,16 +38,34 @@ class TreeSearchNode:
 
     @property
     def q(self):
-        return self._result
+        return float(self.statistics.results[self.index])
 
     @property
     def n(self):
-        return self._number_of_visits
+        return float(self.statistics.visits[self.index])
 
-    def expand(self):
+    def expand(self, transpositions=None):
+        """Adds the child of the next untried action. Removals commute, so the
+        child is taken from the transposition table if its topology was
+        reached before on another path."""
+        # Without the truss FEA or the fea pool a child is evaluated by its rollout
+        if self.state.batches_removals():
+            if self.state.config.widening_constant > 0:
+                # Only the children which are expanded are evaluated
+                self.state.evaluate_removals(self.untried_actions[-1:])
+            elif not self.children_evaluated:
+                self.state.evaluate_removals(self.untried_actions)
+                self.children_evaluated = True
         action = self.untried_actions.pop()
         next_state = self.state.move(action)
-        child_node = TreeSearchNode(state=next_state, parent=self)
+        if transpositions is None:
+            child_node = TreeSearchNode(state=next_state, parent=self)
+        else:
+            key = next_state.get_topology_key()
+            child_node = transpositions.get(key)
+            if child_node is None:
+                child_node = TreeSearchNode(state=next_state, parent=self)
+                transpositions[key] = child_node
         self.children.append(child_node)
         return child_node
 
@@ -45,39 +73,60 @@ class TreeSearchNode:
         return self.state.calculate_fea_score() < 0
 
     def rollout(self):
+        for state in self.rollout_states():
+            state.calculate_fea_score()
+        return self.score
+
+    def rollout_states(self):
+        """Runs the rollout and yields every state whose fea score is needed before
+        it is known, so that the caller can calculate it. Sets the score when the
+        rollout is finished."""
         current_rollout_state = self.state
-        while not current_rollout_state.should_stop_search():
-            possible_moves = current_rollout_state.get_legal_actions()
-            action = self.rollout_policy(possible_moves)
-            current_rollout_state = current_rollout_state.move(action)
+        while True:
+            if current_rollout_state.fea_score is None:
+                yield current_rollout_state
+            if current_rollout_state.should_stop_search():
+                break
+            edge = self.rollout_policy(current_rollout_state.edges)
+            action = RemoveEdgeAction(edge)
+            if current_rollout_state is self.state:
+                current_rollout_state = current_rollout_state.move(action)
+            else:
+                # The states of the rollout are not kept, so the copy made in the
+                # first step is changed in place
+                action.apply(current_rollout_state)
         fea_score = current_rollout_state.calculate_fea_score()
         self.score = (
             -1
             if fea_score < 0
             else (1 - (self.state.total_length() / self.state.max_total_edge_length))
         )
-        return self.score
-
-    def backpropagate(self, result):
-        self._number_of_visits += 1.0
-        self._result += result
-        if self.parent:
-            self.parent.backpropagate(result)
 
     def is_fully_expanded(self):
-        return len(self.untried_actions) == 0
+        if len(self.untried_actions) == 0:
+            return True
+        # With progressive widening the number of children grows with the visits
+        constant = self.state.config.widening_constant
+        exponent = self.state.config.widening_exponent
+        return constant > 0 and len(self.children) >= max(
+            1, constant * self.n**exponent
+        )
+
+    def get_child_indices(self):
+        if self._child_indices is None or len(self._child_indices) != len(
+            self.children
+        ):
+            self._child_indices = np.array([c.index for c in self.children])
+        return self._child_indices
 
     def best_child(self, c_param=0.3):
-        choices_weights = [
-            (c.q / c.n) + c_param * np.sqrt((2 * np.log(self.n) / c.n))
-            for c in self.children
-        ]
+        choices_weights = self.statistics.ucb(
+            self.index, self.get_child_indices(), c_param
+        )
         return self.children[np.argmax(choices_weights)]
 
     def best_children(self, n):
-        choices_weights = [
-            (c.q / c.n) + np.sqrt((2 * np.log(self.n) / c.n)) for c in self.children
-        ]
+        choices_weights = self.statistics.ucb(self.index, self.get_child_indices(), 1)
         return [self.children[i] for i in np.argsort(choices_weights)[-n:]]
 
     def rollout_policy(self, possible_moves):
@@ -87,27 +136,61 @@ class TreeSearchNode:
 class TrussSearchTree:
     def __init__(self, root: TreeSearchNode) -> None:
         self.root = root
+        self.statistics = root.statistics
+        # Node of every topology in the tree, which is shared by all paths to it
+        self.transpositions = {root.state.get_topology_key(): root}
+        # (parent, child, edge) indices of the links added since the last
+        # checkpoint, None if the tree is not checkpointed
+        self.new_links = None
+        # number of finished rollouts
+        self.iterations = 0
+        # BestDesigns updated after every rollout, if it is set
+        self.best_designs = None
 
-    def simulate(self, simulations_number):
+    def should_stop(self, deadline=None, patience=0):
+        """Whether the time.monotonic() deadline passed or the best designs did
+        not change for patience iterations."""
+        if deadline is not None and time.monotonic() >= deadline:
+            return True
+        return (
+            patience > 0
+            and self.best_designs is not None
+            and self.iterations - self.best_designs.last_update >= patience
+        )
+
+    def simulate(
+        self, simulations_number, show_progress=True, deadline=None, patience=0
+    ):
         """
 
         Parameters
         ----------
         simulations_number : int
             number of simulations performed to get the best action
+        show_progress : bool
+            whether a progress bar is shown
+        deadline : float
+            time.monotonic() after which no simulation is started, None for no limit
+        patience : int
+            number of simulations without a new best design after which the
+            search stops, 0 for no limit
 
         Returns
         -------
+        number of simulations performed, fewer if the search stopped early
 
         """
 
-        for simulation in tqdm(range(0, simulations_number)):
+        for simulation in tqdm(range(0, simulations_number), disable=not show_progress):
+            if self.should_stop(deadline, patience):
+                return simulation
             # selection
-            v = self._tree_policy()
+            path = self._tree_policy()
             # rollout
-            reward = v.rollout()
+            reward = path[-1].rollout()
             # backpropagation
-            v.backpropagate(reward)
+            self.statistics.update([node.index for node in path], 1.0, reward)
+            self._finish_rollout(path[-1])
             # if simulation % 100 == 0:
             #     visualize(
             #         nodes=v.state.nodes,
@@ -115,6 +198,99 @@ class TrussSearchTree:
             #         dirname="output/run/",
             #         filename=f"{simulation}.png",
             #     )
+        return simulations_number
+
+    def simulate_parallel(
+        self,
+        simulations_number,
+        num_pending,
+        virtual_loss=1.0,
+        show_progress=True,
+        deadline=None,
+        patience=0,
+    ):
+        """Keeps up to num_pending rollouts in the tree at the same time.
+
+        The selected paths get a virtual loss until their rollout is finished,
+        so that the pending rollouts spread across the tree. The FEA of the
+        rollout states runs in the fea pool, and the rollouts are continued
+        and backpropagated in the order their results complete.
+
+        Parameters
+        ----------
+        simulations_number : int
+            number of simulations performed to get the best action
+        num_pending : int
+            maximum number of rollouts which wait for their FEA
+        virtual_loss : float
+            reward subtracted from the path of a pending rollout
+        show_progress : bool
+            whether a progress bar is shown
+        deadline : float
+            time.monotonic() after which no simulation is started, None for no limit
+        patience : int
+            number of simulations without a new best design after which the
+            search stops, 0 for no limit
+
+        Returns
+        -------
+        number of simulations performed, fewer if the search stopped early
+
+        """
+        # future -> (selected path, rollout of its leaf, state of the future)
+        pending = {}
+        started = 0
+        progress = tqdm(total=simulations_number, disable=not show_progress)
+        try:
+            while started < simulations_number or pending:
+                while started < simulations_number and len(pending) < num_pending:
+                    if self.should_stop(deadline, patience):
+                        # The pending rollouts are still finished
+                        simulations_number = started
+                        break
+                    # selection
+                    path = self._tree_policy()
+                    # A pending rollout counts as a lost visit of the path, so
+                    # that the next selections prefer other branches
+                    self.statistics.update(
+                        [node.index for node in path], 1.0, -virtual_loss
+                    )
+                    started += 1
+                    self._continue_rollout(
+                        path, path[-1].rollout_states(), virtual_loss, pending, progress
+                    )
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, rollout, state = pending.pop(future)
+                    state.complete_fea(future)
+                    self._continue_rollout(
+                        path, rollout, virtual_loss, pending, progress
+                    )
+        finally:
+            for future in pending:
+                future.cancel()
+            progress.close()
+        return started
+
+    def _continue_rollout(self, path, rollout, virtual_loss, pending, progress):
+        """Runs the rollout of the leaf of the path until it waits for an FEA in
+        the pool or is finished, then it is backpropagated."""
+        for state in rollout:
+            future = state.submit_fea()
+            if future is not None:
+                pending[future] = (path, rollout, state)
+                return
+        # backpropagation
+        indices = [node.index for node in path]
+        self.statistics.update(indices, -1.0, virtual_loss)
+        self.statistics.update(indices, 1.0, path[-1].score)
+        self._finish_rollout(path[-1])
+        progress.update()
+
+    def _finish_rollout(self, v):
+        self.iterations += 1
+        if self.best_designs is not None:
+            self.best_designs.update(v, self.iterations)
 
     def _tree_policy(self):
         """
@@ -122,39 +298,38 @@ class TrussSearchTree:
 
         Returns
         -------
+        list of the nodes from the root to the selected node
 
         """
-        current_node = self.root
-        while not current_node.is_terminal_node():
-            if not current_node.is_fully_expanded():
-                return current_node.expand()
+        path = [self.root]
+        while not path[-1].is_terminal_node():
+            if not path[-1].is_fully_expanded():
+                path.append(path[-1].expand(self.transpositions))
+                if self.new_links is not None:
+                    self._add_link(path[-2], path[-1])
+                return path
             else:
-                current_node = current_node.best_child()
-        return current_node
+                path.append(path[-1].best_child())
+        return path
 
-    def get_leafs(self):
-        leafs = []
-        stack = [self.root]
-        while stack:
-            node = stack.pop()
-            if node.is_terminal_node():
-                leafs.append(node)
-            else:
-                stack.extend(node.children)
-        return leafs
+    def _add_link(self, parent, child):
+        # The masks of a parent and its child only differ by the removed edge
+        removed = parent.state.edge_mask ^ child.state.edge_mask
+        self.new_links.append((parent.index, child.index, removed.bit_length() - 1))
 
-    def get_k_best_children(self, k: int):
-        children = []
+    def get_nodes(self):
+        """Every node of the tree once, in depth first order."""
+        nodes = []
+        seen = set()
         stack = [self.root]
         while stack:
             node = stack.pop()
-            children.append(node)
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            nodes.append(node)
             stack.extend(node.children)
-        children.sort(key=lambda x: x.score)
-        print("Scores")
-        print([child.score for child in children])
-        # print("Best Scores")
-        # print([child.score for child in children[-k:]])
-        # print("FEA Scores")
-        # print([child.state.calculate_fea_score() for child in children])
-        return children[-k:]
+        return nodes
+
+    def get_leafs(self):
+        return [node for node in self.get_nodes() if node.is_terminal_node()]
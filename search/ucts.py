@@ -1,61 +1,144 @@
+import random
+import time
 from pathlib import Path
 
+import numpy as np
+
+from search.best_designs import BestDesigns
+from search.checkpoint import Checkpoint
 from search.config import GeneralConfig, UCTSConfig
+from search.fea_pool import fea_pool
+from search.parallel import simulate_root_parallel
+from search.rigidity_check import rigidity_check
 from search.state import State
 from search.truss_search_tree import TreeSearchNode, TrussSearchTree
 from utils.parser import read_json, write_json
 from utils.plot import visualize
 
 
-def execute(config_file: str) -> None:
+def execute(config_file: str, resume: bool = False) -> None:
     general_config = GeneralConfig(config_file)
     ucts_config = UCTSConfig(config_file)
 
-    nodes, edges = read_json(general_config.input_file)
+    if ucts_config.seed is not None:
+        # Seeds the ground structure and the rollouts of a single tree, the trees
+        # of a root-parallel search are seeded again in their processes
+        random.seed(ucts_config.seed)
+        np.random.seed(ucts_config.seed)
+    rigidity_check.clear()
 
-    state = State(config=ucts_config, nodes=nodes, edges=edges)
-    state.init_fully_connected()
+    folder_name = Path(general_config.input_file).stem
+    output_path = f"{general_config.output_folder}{folder_name}/"
+    checkpoint = Checkpoint(f"{output_path}checkpoint/")
+    if resume and ucts_config.num_trees > 1:
+        raise ValueError("Only the search of a single tree can be resumed")
+    if resume and not checkpoint.exists():
+        raise ValueError(f"There is no checkpoint in {checkpoint.dirname}")
+    mcts = None
+    iterations = 0
+    if resume:
+        mcts, iterations = checkpoint.load(ucts_config)
+        state = mcts.root.state
+        print(f"resuming the search after {iterations} iterations")
+    else:
+        nodes, edges = read_json(general_config.input_file)
+        state = State(config=ucts_config, nodes=nodes, edges=edges)
+        state.init_fully_connected()
 
     visualize(
         nodes=state.nodes,
         edges=state.edges,
     )
 
+    if ucts_config.num_trees > 1:
+        statistics, designs = simulate_root_parallel(
+            state, ucts_config, general_config.k
+        )
+        if statistics:
+            n, q = max(statistics.values())
+            print(
+                f"merged root: {len(statistics)} children, most visited {n} ({q / n})"
+            )
+        best_children = [
+            (score, state.select(node_mask, edge_mask))
+            for score, node_mask, edge_mask in designs
+        ]
+    else:
+        if mcts is None:
+            root = TreeSearchNode(state=state, parent=None)
+            mcts = TrussSearchTree(root=root)
+            if ucts_config.checkpoint_interval > 0:
+                checkpoint.create(mcts)
+        mcts.best_designs = BestDesigns(
+            general_config.k, f"{output_path}best_designs.jsonl", append=iterations > 0
+        )
+        mcts.best_designs.add_nodes(mcts.get_nodes(), iterations)
+        deadline = None
+        if ucts_config.time_limit is not None:
+            deadline = time.monotonic() + ucts_config.time_limit
+        fea_pool.start(
+            ucts_config.fea, state.nodes, state.edges, ucts_config.num_workers
+        )
+        try:
+            while iterations < ucts_config.max_iter:
+                simulations = min(
+                    ucts_config.checkpoint_interval or ucts_config.max_iter,
+                    ucts_config.max_iter - iterations,
+                )
+                if ucts_config.num_pending > 1:
+                    done = mcts.simulate_parallel(
+                        simulations,
+                        ucts_config.num_pending,
+                        ucts_config.virtual_loss,
+                        deadline=deadline,
+                        patience=ucts_config.patience,
+                    )
+                else:
+                    done = mcts.simulate(
+                        simulations, deadline=deadline, patience=ucts_config.patience
+                    )
+                iterations += done
+                # Resumed trees are checkpointed as well
+                if mcts.new_links is not None:
+                    checkpoint.save(mcts, iterations)
+                if done < simulations:
+                    print(f"search stopped after {iterations} iterations")
+                    break
+        finally:
+            fea_pool.shutdown()
+        print(state.score_cache)
+        print(rigidity_check)
+        best_children = [
+            (score, child.state) for score, child in mcts.best_designs.get()
+        ]
 
-    root = TreeSearchNode(state=state, parent=None)
-    mcts = TrussSearchTree(root=root)
-    mcts.simulate(ucts_config.max_iter)
-
-    folder_name = Path(general_config.input_file).stem
-    output_path = f"{general_config.output_folder}{folder_name}/"
     # shutil.rmtree(output_path)
     # shutil.rmtree(image_path)
 
     # visualize_tree(root)
     # return
     # Store and print best k children
-    best_children = mcts.get_k_best_children(general_config.k)
-    for i, child in enumerate(best_children):
-        nodes = [node for node in child.state.nodes]
-        edges = [edge for edge in child.state.edges]
+    for i, (score, child_state) in enumerate(best_children):
+        nodes = [node for node in child_state.nodes]
+        edges = [edge for edge in child_state.edges]
         print(
             "visualizing child",
             i,
             "with score",
-            child.score,
+            score,
             " and ",
             len(edges),
             "edges",
         )
         write_json(
-            nodes=child.state.nodes,
-            edges=child.state.edges,
+            nodes=child_state.nodes,
+            edges=child_state.edges,
             dirname=output_path,
             filename=f"{i}.json",
         )
         visualize(
-            nodes=child.state.nodes,
-            edges=child.state.edges,
+            nodes=child_state.nodes,
+            edges=child_state.edges,
             dirname=output_path,
             filename=f"{i}.png",
         )
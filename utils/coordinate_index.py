@@ -0,0 +1,55 @@
+import itertools
+import math
+from collections import defaultdict
+
+from utils.models import Node, Vector3
+
+# Nodes closer than this are one joint, e.g. midpoints computed in another order
+NODE_TOLERANCE = 1e-9
+
+
+class CoordinateIndex:
+    """Hash of node coordinates to find the node at a position within a tolerance.
+
+    Coordinates are quantized to cells of the size of the tolerance, so a node
+    within the tolerance of a position is in its cell or a neighboring one.
+    """
+
+    def __init__(self, tolerance: float = NODE_TOLERANCE) -> None:
+        self.tolerance = tolerance
+        self.cells: dict[tuple, list[Node]] = defaultdict(list)
+
+    def _get_cell(self, vec: Vector3) -> tuple[int, int, int]:
+        return (
+            math.floor(vec.x / self.tolerance),
+            math.floor(vec.y / self.tolerance),
+            math.floor(vec.z / self.tolerance),
+        )
+
+    def find(self, vec: Vector3) -> Node | None:
+        x, y, z = self._get_cell(vec)
+        for offset in itertools.product([-1, 0, 1], repeat=3):
+            cell = (x + offset[0], y + offset[1], z + offset[2])
+            for node in self.cells.get(cell, ()):
+                distance = math.dist(
+                    (node.vec.x, node.vec.y, node.vec.z), (vec.x, vec.y, vec.z)
+                )
+                if distance <= self.tolerance:
+                    return node
+        return None
+
+    def add(self, node: Node) -> None:
+        self.cells[self._get_cell(node.vec)].append(node)
+
+    def remove(self, node: Node) -> None:
+        cell = self._get_cell(node.vec)
+        self.cells[cell] = [n for n in self.cells[cell] if n.id != node.id]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def copy(self) -> "CoordinateIndex":
+        index = CoordinateIndex(self.tolerance)
+        index.cells = defaultdict(
+            list, {cell: list(nodes) for cell, nodes in self.cells.items()}
+        )
+        return index
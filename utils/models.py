@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import math
+
 import numpy as np
 
 
@@ -69,6 +71,7 @@ class Node:
         t_support: Bool3 | None = None,
         load: Vector3 | None = None,
         fixed: bool = False,
+        load_cases: dict[str, Vector3] | None = None,
     ) -> None:
         self.id = id
         self.vec = vec
@@ -76,6 +79,8 @@ class Node:
         self.t_support = t_support
         self.load = load
         self.fixed = fixed
+        # loads of the additional load cases by name, load is the default case
+        self.load_cases = load_cases if load_cases is not None else {}
 
     def get_json(self) -> dict:
         return {
@@ -97,6 +102,10 @@ class Node:
                 else None
             ),
             "fixed": self.fixed,
+            "load_cases": {
+                name: {"x": load.x, "y": load.y, "z": load.z}
+                for name, load in self.load_cases.items()
+            },
         }
     
     def to_array(self):
@@ -118,3 +127,248 @@ class Edge:
 
         squared_dist = np.sum((p1 - p2) ** 2, axis=0)
         return np.sqrt(squared_dist)
+
+
+class TrussGraph:
+    """Nodes and edges of a truss as a structure of arrays.
+
+    Nodes are rows of the coordinate, support and load arrays, edges are rows
+    of the connectivity array with the indices of their nodes. The nodes and
+    edges properties return NodeView and EdgeView objects, which behave like
+    Node and Edge. The graph is shared by all copies of its views, so it is
+    not changed after it was built, except for the loads while parsing.
+    """
+
+    def __init__(
+        self,
+        node_ids: list[str],
+        coordinates: np.ndarray,
+        edge_ids: list[str],
+        connectivity: np.ndarray,
+        supported: np.ndarray | None = None,
+        r_supports: np.ndarray | None = None,
+        t_supports: np.ndarray | None = None,
+        loaded: np.ndarray | None = None,
+        loads: np.ndarray | None = None,
+        fixed: np.ndarray | None = None,
+        load_cases: list[dict] | None = None,
+    ) -> None:
+        num_nodes = len(node_ids)
+        self.node_ids = list(node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 3)
+        self.edge_ids = list(edge_ids)
+        self.connectivity = np.asarray(connectivity, dtype=np.int32).reshape(-1, 2)
+        # Nodes with support have both r_support and t_support
+        self.supported = (
+            np.zeros(num_nodes, dtype=bool) if supported is None else supported
+        )
+        self.r_supports = (
+            np.zeros((num_nodes, 3), dtype=bool) if r_supports is None else r_supports
+        )
+        self.t_supports = (
+            np.zeros((num_nodes, 3), dtype=bool) if t_supports is None else t_supports
+        )
+        self.loaded = np.zeros(num_nodes, dtype=bool) if loaded is None else loaded
+        self.loads = np.zeros((num_nodes, 3)) if loads is None else loads
+        self.fixed = np.zeros(num_nodes, dtype=bool) if fixed is None else fixed
+        self.load_cases = (
+            [{} for _ in range(num_nodes)] if load_cases is None else load_cases
+        )
+        self._nodes = None
+        self._edges = None
+
+    @classmethod
+    def from_objects(cls, nodes: list[Node], edges: list[Edge]) -> TrussGraph:
+        node_index = {node.id: i for i, node in enumerate(nodes)}
+        return cls(
+            node_ids=[node.id for node in nodes],
+            coordinates=[[node.vec.x, node.vec.y, node.vec.z] for node in nodes],
+            edge_ids=[edge.id for edge in edges],
+            connectivity=[
+                [node_index[edge.u.id], node_index[edge.v.id]] for edge in edges
+            ],
+            supported=np.array(
+                [bool(node.r_support and node.t_support) for node in nodes], dtype=bool
+            ),
+            r_supports=np.array(
+                [
+                    [node.r_support.x, node.r_support.y, node.r_support.z]
+                    if node.r_support and node.t_support
+                    else [False, False, False]
+                    for node in nodes
+                ],
+                dtype=bool,
+            ).reshape(-1, 3),
+            t_supports=np.array(
+                [
+                    [node.t_support.x, node.t_support.y, node.t_support.z]
+                    if node.r_support and node.t_support
+                    else [False, False, False]
+                    for node in nodes
+                ],
+                dtype=bool,
+            ).reshape(-1, 3),
+            loaded=np.array([node.load is not None for node in nodes], dtype=bool),
+            loads=np.array(
+                [
+                    [node.load.x, node.load.y, node.load.z] if node.load else [0, 0, 0]
+                    for node in nodes
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 3),
+            fixed=np.array([node.fixed for node in nodes], dtype=bool),
+            load_cases=[dict(node.load_cases) for node in nodes],
+        )
+
+    @classmethod
+    def from_nodes(cls, nodes: list, edges: list) -> TrussGraph:
+        """Graph of the nodes and edges, sliced from their graph if they are views."""
+        graph = nodes[0].graph if nodes and isinstance(nodes[0], NodeView) else None
+        if (
+            graph is not None
+            and all(isinstance(n, NodeView) and n.graph is graph for n in nodes)
+            and all(isinstance(e, EdgeView) and e.graph is graph for e in edges)
+        ):
+            return graph.subgraph(
+                [node.index for node in nodes], [edge.index for edge in edges]
+            )
+        return cls.from_objects(nodes, edges)
+
+    def subgraph(self, node_indices: list[int], edge_indices: list[int]) -> TrussGraph:
+        node_indices = np.asarray(node_indices, dtype=np.int64)
+        edge_indices = np.asarray(edge_indices, dtype=np.int64)
+        mapping = np.full(len(self.node_ids), -1, dtype=np.int32)
+        mapping[node_indices] = np.arange(len(node_indices))
+        return TrussGraph(
+            node_ids=[self.node_ids[i] for i in node_indices],
+            coordinates=self.coordinates[node_indices],
+            edge_ids=[self.edge_ids[i] for i in edge_indices],
+            connectivity=mapping[self.connectivity[edge_indices]],
+            supported=self.supported[node_indices],
+            r_supports=self.r_supports[node_indices],
+            t_supports=self.t_supports[node_indices],
+            loaded=self.loaded[node_indices],
+            loads=self.loads[node_indices],
+            fixed=self.fixed[node_indices],
+            load_cases=[self.load_cases[i] for i in node_indices],
+        )
+
+    def get_loads(self, load_case: str | None = None) -> np.ndarray:
+        """Loads of the given load case, None is the case of Node.load."""
+        if load_case is None:
+            return np.where(self.loaded[:, None], self.loads, 0)
+        loads = np.zeros((len(self.node_ids), 3))
+        for i, load_cases in enumerate(self.load_cases):
+            if load_case in load_cases:
+                load = load_cases[load_case]
+                loads[i] = [load.x, load.y, load.z]
+        return loads
+
+    @property
+    def nodes(self) -> list[NodeView]:
+        # The views are created once, the list is a copy which may be changed
+        if self._nodes is None:
+            self._nodes = [NodeView(self, i) for i in range(len(self.node_ids))]
+        return list(self._nodes)
+
+    @property
+    def edges(self) -> list[EdgeView]:
+        if self._edges is None:
+            nodes = self.nodes
+            self._edges = [
+                EdgeView(self, i, nodes[u], nodes[v])
+                for i, (u, v) in enumerate(self.connectivity.tolist())
+            ]
+        return list(self._edges)
+
+    def __deepcopy__(self, memo) -> TrussGraph:
+        return self
+
+
+class NodeView:
+    """Node of a TrussGraph with the interface of Node."""
+
+    __slots__ = ("graph", "index", "_vec")
+
+    def __init__(self, graph: TrussGraph, index: int) -> None:
+        self.graph = graph
+        self.index = index
+        self._vec = None
+
+    @property
+    def id(self) -> str:
+        return self.graph.node_ids[self.index]
+
+    @property
+    def vec(self) -> Vector3:
+        # Created on the first access, the coordinates of a graph do not change
+        if self._vec is None:
+            self._vec = Vector3(*self.graph.coordinates[self.index])
+        return self._vec
+
+    @property
+    def r_support(self) -> Bool3 | None:
+        if not self.graph.supported[self.index]:
+            return None
+        return Bool3(*self.graph.r_supports[self.index].tolist())
+
+    @property
+    def t_support(self) -> Bool3 | None:
+        if not self.graph.supported[self.index]:
+            return None
+        return Bool3(*self.graph.t_supports[self.index].tolist())
+
+    @property
+    def load(self) -> Vector3 | None:
+        if not self.graph.loaded[self.index]:
+            return None
+        return Vector3(*self.graph.loads[self.index])
+
+    @load.setter
+    def load(self, load: Vector3 | None) -> None:
+        self.graph.loaded[self.index] = load is not None
+        self.graph.loads[self.index] = [load.x, load.y, load.z] if load else [0, 0, 0]
+
+    @property
+    def fixed(self) -> bool:
+        return bool(self.graph.fixed[self.index])
+
+    @property
+    def load_cases(self) -> dict[str, Vector3]:
+        return self.graph.load_cases[self.index]
+
+    def get_json(self) -> dict:
+        return Node.get_json(self)
+
+    def to_array(self):
+        return self.graph.coordinates[self.index].tolist()
+
+    def __deepcopy__(self, memo) -> NodeView:
+        return self
+
+
+class EdgeView:
+    """Edge of a TrussGraph with the interface of Edge."""
+
+    __slots__ = ("graph", "index", "u", "v")
+
+    def __init__(self, graph: TrussGraph, index: int, u: NodeView, v: NodeView) -> None:
+        self.graph = graph
+        self.index = index
+        self.u = u
+        self.v = v
+
+    @property
+    def id(self) -> str:
+        return self.graph.edge_ids[self.index]
+
+    def get_json(self) -> dict:
+        return Edge.get_json(self)
+
+    def length(self) -> float:
+        coordinates = self.graph.coordinates
+        return math.dist(coordinates[self.u.index], coordinates[self.v.index])
+
+    def __deepcopy__(self, memo) -> EdgeView:
+        return self
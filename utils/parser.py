@@ -2,56 +2,80 @@ import json
 import os
 import uuid
 
-from utils.models import Bool3, Edge, Node, Vector3
+import numpy as np
 
+from utils.models import Edge, EdgeView, Node, NodeView, TrussGraph, Vector3
 
-def read_json(filename: str) -> tuple[list[Node], list[Edge]]:
-    nodes = []
-    edges = []
+
+def read_graph(filename: str) -> TrussGraph:
     with open(filename) as f:
         data = json.load(f)
-        for id, coordinates in data["nodes"].items():
-            if id in data["anchors"]:
-                anchor = data["anchors"][id]
-                nodes.append(
-                    Node(
-                        id=id,
-                        vec=Vector3(
-                            x=coordinates["x"], y=coordinates["y"], z=coordinates["z"]
-                        ),
-                        r_support=Bool3(x=anchor["rx"], y=anchor["ry"], z=anchor["rz"]),
-                        t_support=Bool3(x=anchor["tx"], y=anchor["ty"], z=anchor["tz"]),
-                        fixed=True,
-                    )
+    node_ids = list(data["nodes"])
+    node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+    anchors = data.get("anchors", {})
+    loaded = np.zeros(len(node_ids), dtype=bool)
+    loads = np.zeros((len(node_ids), 3))
+    for force in data.get("forces", {}).values():
+        for node_id in force["nodes"]:
+            loaded[node_index[node_id]] = True
+            loads[node_index[node_id]] = [force["x"], force["y"], force["z"]]
+    load_cases = [{} for _ in node_ids]
+    for name, forces in data.get("load_cases", {}).items():
+        for force in forces.values():
+            for node_id in force["nodes"]:
+                load_cases[node_index[node_id]][name] = Vector3(
+                    x=force["x"], y=force["y"], z=force["z"]
+                )
+    edges = data.get("edges", {})
+    return TrussGraph(
+        node_ids=node_ids,
+        coordinates=[
+            [coordinates["x"], coordinates["y"], coordinates["z"]]
+            for coordinates in data["nodes"].values()
+        ],
+        edge_ids=list(edges),
+        connectivity=[
+            [node_index[values["start"]], node_index[values["end"]]]
+            for values in edges.values()
+        ],
+        supported=np.array([node_id in anchors for node_id in node_ids], dtype=bool),
+        r_supports=np.array(
+            [
+                (
+                    [anchors[node_id][key] for key in ["rx", "ry", "rz"]]
+                    if node_id in anchors
+                    else [False, False, False]
                 )
-            else:
-                nodes.append(
-                    Node(
-                        id=id,
-                        vec=Vector3(
-                            x=coordinates["x"], y=coordinates["y"], z=coordinates["z"]
-                        ),
-                        fixed=True,
-                    )
+                for node_id in node_ids
+            ],
+            dtype=bool,
+        ).reshape(-1, 3),
+        t_supports=np.array(
+            [
+                (
+                    [anchors[node_id][key] for key in ["tx", "ty", "tz"]]
+                    if node_id in anchors
+                    else [False, False, False]
                 )
-        if "forces" in data:
-            for id, force in data["forces"].items():
-                for node_id in force["nodes"]:
-                    node = next(node for node in nodes if node.id == node_id)
-                    node.load = Vector3(x=force["x"], y=force["y"], z=force["z"])
-        if "edges" in data:
-            for id, values in data["edges"].items():
-                u = next(node for node in nodes if node.id == values["start"])
-                v = next(node for node in nodes if node.id == values["end"])
-                edges.append(Edge(id, u, v))
-    return nodes, edges
+                for node_id in node_ids
+            ],
+            dtype=bool,
+        ).reshape(-1, 3),
+        loaded=loaded,
+        loads=loads,
+        fixed=np.ones(len(node_ids), dtype=bool),
+        load_cases=load_cases,
+    )
 
 
-def write_json(
-    nodes: list[Node], edges: list[Edge], dirname: str, filename: str
-) -> None:
-    os.makedirs(dirname, exist_ok=True)
+def read_json(filename: str) -> tuple[list[NodeView], list[EdgeView]]:
+    graph = read_graph(filename)
+    return graph.nodes, graph.edges
+
+
+def get_json(nodes: list[Node], edges: list[Edge]) -> dict:
     result = {"nodes": {}, "edges": {}, "anchors": {}, "forces": {}}
+    load_cases = {}
     for node in nodes:
         result["nodes"][node.id] = {
             "x": float(node.vec.x),
@@ -85,8 +109,24 @@ def write_json(
                     "y": node.load.y,
                     "z": node.load.z,
                 }
+        for name, load in node.load_cases.items():
+            load_cases.setdefault(name, {})[str(uuid.uuid4())] = {
+                "nodes": [node.id],
+                "x": load.x,
+                "y": load.y,
+                "z": load.z,
+            }
+    if load_cases:
+        result["load_cases"] = load_cases
 
     for edge in edges:
         result["edges"][edge.id] = {"start": edge.u.id, "end": edge.v.id}
+    return result
+
+
+def write_json(
+    nodes: list[Node], edges: list[Edge], dirname: str, filename: str
+) -> None:
+    os.makedirs(dirname, exist_ok=True)
     with open(f"{dirname}{filename}", "w") as f:
-        json.dump(result, f)
+        json.dump(get_json(nodes, edges), f)